@@ -1,16 +1,204 @@
-import { NextResponse } from 'next/server'
+import { NextRequest, NextResponse } from 'next/server'
 import { promises as fs } from 'fs'
+import { createHash } from 'crypto'
 import path from 'path'
 
-export async function GET() {
-  const filePath = path.join(process.cwd(), 'training_results.json')
+// Run store written by scripts/run_store.py; training_results.json is the fallback
+const RUNS_DIR = process.env.ROBERTANET_RUNS_DIR || path.join(process.cwd(), 'runs')
+const RUN_ID_PATTERN = /^[\w.-]+$/
+const DEFAULT_METRICS_LIMIT = 1000
+
+type Cached<T> = { size: number; mtimeMs: number; value: T }
+type CachedLines = { offset: number; records: any[] }
+type Loaded<T> = { value: T; tag: string }
+
+const jsonCache = new Map<string, Cached<any>>()
+const linesCache = new Map<string, CachedLines>()
+
+class HttpError extends Error {
+  constructor(public status: number, message: string) {
+    super(message)
+  }
+}
+
+// Parsed JSON file, reparsed only when its size or mtime changes
+async function readJson(filePath: string): Promise<Loaded<any> | null> {
+  let stat
+  try {
+    stat = await fs.stat(filePath)
+  } catch {
+    return null
+  }
+  const tag = `${stat.size}-${stat.mtimeMs}`
+  const cached = jsonCache.get(filePath)
+  if (cached && cached.size === stat.size && cached.mtimeMs === stat.mtimeMs) {
+    return { value: cached.value, tag }
+  }
+  const value = JSON.parse(await fs.readFile(filePath, 'utf-8'))
+  jsonCache.set(filePath, { size: stat.size, mtimeMs: stat.mtimeMs, value })
+  return { value, tag }
+}
+
+// Append-only JSON lines file; only complete lines added since the last read are parsed
+async function readJsonLines(filePath: string): Promise<Loaded<any[]> | null> {
+  let stat
+  try {
+    stat = await fs.stat(filePath)
+  } catch {
+    return null
+  }
+  let cached = linesCache.get(filePath)
+  if (!cached || stat.size < cached.offset) {
+    // First read, or the file was replaced
+    cached = { offset: 0, records: [] }
+  }
+  if (stat.size > cached.offset) {
+    const handle = await fs.open(filePath, 'r')
+    try {
+      const buffer = Buffer.alloc(stat.size - cached.offset)
+      const { bytesRead } = await handle.read(buffer, 0, buffer.length, cached.offset)
+      const end = buffer.subarray(0, bytesRead).lastIndexOf(0x0a) + 1
+      const lines = buffer.subarray(0, end).toString('utf-8').split('\n')
+      const records = cached.records.concat(lines.filter((line) => line.trim()).map((line) => JSON.parse(line)))
+      cached = { offset: cached.offset + end, records }
+    } finally {
+      await handle.close()
+    }
+    linesCache.set(filePath, cached)
+  }
+  return { value: cached.records, tag: String(cached.offset) }
+}
+
+async function listRuns(): Promise<Loaded<any[]> | null> {
+  const index = await readJsonLines(path.join(RUNS_DIR, 'index.jsonl'))
+  if (!index) return null
+  const runs = new Map<string, any>()
+  for (const { event, ...fields } of index.value) {
+    runs.set(fields.run_id, { status: 'running', ...runs.get(fields.run_id), ...fields })
+  }
+  return { value: Array.from(runs.values()), tag: index.tag }
+}
+
+// Requested run, else the latest run (completed only, when test metrics are needed)
+function pickRun(runs: any[], runId: string | null, completedOnly: boolean) {
+  if (runId) {
+    if (!RUN_ID_PATTERN.test(runId)) throw new HttpError(400, 'Invalid run id')
+    const run = runs.find((r) => r.run_id === runId)
+    if (!run) throw new HttpError(404, `Run ${runId} not found`)
+    return run
+  }
+  const candidates = completedOnly ? runs.filter((r) => r.status === 'completed') : runs
+  return candidates[candidates.length - 1] ?? null
+}
+
+// Results in the shape of the old training_results.json, rebuilt from the run files
+function runResults(meta: any, summary: any, epochs: any[]) {
+  const history = {
+    train_loss: epochs.map((e) => e.train_loss),
+    train_acc: epochs.map((e) => e.train_acc),
+    val_loss: epochs.map((e) => e.val_loss),
+    val_acc: epochs.map((e) => e.val_acc)
+  }
+  const best = epochs.reduce<any>((a, b) => (a && a.val_acc >= b.val_acc ? a : b), null)
+  const bestMetrics = best && {
+    accuracy: best.val_acc,
+    precision: best.val_precision,
+    recall: best.val_recall,
+    f1: best.val_f1,
+    confusion_matrix: best.confusion_matrix
+  }
+  return {
+    run_id: meta.run_id,
+    status: summary?.status ?? 'running',
+    training_results: {
+      best_val_acc: summary?.best_val_acc ?? best?.val_acc ?? 0,
+      best_metrics: summary?.best_metrics ?? bestMetrics ?? {},
+      train_history: history
+    },
+    test_metrics: summary?.test_metrics ?? null,
+    model_config: meta.model_config,
+    data_info: meta.data_info
+  }
+}
+
+async function queryRuns(params: URLSearchParams, runs: Loaded<any[]>): Promise<Loaded<any>> {
+  if (params.has('runs')) {
+    // Run list, newest first
+    return { value: { runs: runs.value.slice().reverse() }, tag: runs.tag }
+  }
+
+  const kind = params.get('metrics')
+  const run = pickRun(runs.value, params.get('run'), !kind)
+  if (!run) {
+    // Nothing finished yet; the dashboard keeps showing the previous results file
+    return legacyResults(params)
+  }
+  const runDir = path.join(RUNS_DIR, run.run_id)
+  const metrics = await readJsonLines(path.join(runDir, 'metrics.jsonl'))
+  const records = metrics?.value ?? []
+
+  if (kind) {
+    // Incremental metric reads: clients pass back next_since to get only new records
+    const since = Number(params.get('since') ?? 0)
+    const limit = Number(params.get('limit') ?? DEFAULT_METRICS_LIMIT)
+    const selected = records
+      .filter((r) => r.seq > since && (kind === 'all' || r.kind === kind))
+      .slice(0, limit)
+    return {
+      value: {
+        run_id: run.run_id,
+        records: selected,
+        next_since: selected.length ? selected[selected.length - 1].seq : since
+      },
+      tag: `${run.run_id}:${metrics?.tag}`
+    }
+  }
+
+  const meta = await readJson(path.join(runDir, 'meta.json'))
+  if (!meta) throw new HttpError(404, `Run ${run.run_id} has no metadata`)
+  const summary = await readJson(path.join(runDir, 'summary.json'))
+  const epochs = records.filter((r) => r.kind === 'epoch')
+  return {
+    value: runResults(meta.value, summary?.value, epochs),
+    tag: [run.run_id, meta.tag, summary?.tag, metrics?.tag].join(':')
+  }
+}
+
+async function legacyResults(params: URLSearchParams): Promise<Loaded<any>> {
+  if (params.has('runs')) return { value: { runs: [] }, tag: 'none' }
+  const results = await readJson(path.join(process.cwd(), 'training_results.json'))
+  if (!results) throw new HttpError(500, 'Could not read training_results.json')
+  // Older files embed the whole vocabulary; the dashboard only needs its size
+  const { vocab, ...dataInfo } = results.value.data_info ?? {}
+  return { value: { ...results.value, data_info: dataInfo }, tag: results.tag }
+}
+
+export async function GET(request: NextRequest) {
+  const params = request.nextUrl.searchParams
   try {
-    const data = await fs.readFile(filePath, 'utf-8')
-    const json = JSON.parse(data)
-    return NextResponse.json(json)
+    const runs = await listRuns()
+    const result = runs && runs.value.length ? await queryRuns(params, runs) : await legacyResults(params)
+    let body = result.value
+    let tag = result.tag
+
+    // Load-test SLO report (scripts/load_test.py) goes next to the model metrics
+    if (!params.has('runs') && !params.has('metrics')) {
+      const loadTest = await readJson(path.join(process.cwd(), 'load_test_results.json'))
+      body = { ...body, load_test: loadTest?.value ?? null }
+      tag += `:${loadTest?.tag}`
+    }
+
+    const etag = `W/"${createHash('sha1').update(`${request.nextUrl.search}|${tag}`).digest('hex').slice(0, 20)}"`
+    const headers = { ETag: etag, 'Cache-Control': 'no-cache' }
+    if (request.headers.get('if-none-match') === etag) {
+      return new NextResponse(null, { status: 304, headers })
+    }
+    return NextResponse.json(body, { headers })
   } catch (error) {
+    if (error instanceof HttpError) {
+      return NextResponse.json({ error: error.message }, { status: error.status })
+    }
     const errMsg = typeof error === 'object' && error !== null && 'message' in error ? (error as any).message : String(error)
-    return NextResponse.json({ error: 'Could not read training_results.json', details: errMsg }, { status: 500 })
+    return NextResponse.json({ error: 'Could not read results', details: errMsg }, { status: 500 })
   }
 }
-
@@ -27,8 +27,36 @@ type Results = {
   test_metrics: Metrics
   model_config: any
   data_info: any
+  load_test?: LoadTest | null
 }
 
+type LatencySummary = {
+  p50_ms: number | null
+  p99_ms: number | null
+  p999_ms: number | null
+}
+
+type LoadTest = {
+  generated_at: string
+  endpoint: string
+  slo: { p99_ms: number; max_error_rate: number }
+  levels: {
+    offered_rate: number
+    concurrency: number
+    throughput: number
+    error_rate: number
+    latency: LatencySummary
+  }[]
+  saturation_point: {
+    concurrency: number
+    max_sustainable_rate: number
+    throughput_at_max: number
+    p99_ms_at_max: number
+  } | null
+}
+
+const formatMs = (value: number | null) => (value === null ? "-" : value.toFixed(1))
+
 const COLORS = ["#22c55e", "#3b82f6", "#f59e0b", "#ef4444"]
 
 export default function ModelMetrics() {
@@ -52,7 +80,7 @@ export default function ModelMetrics() {
   if (loading) return <div>Loading metrics...</div>
   if (error || !results) return <div>{error || "No results found."}</div>
 
-  const { test_metrics, training_results, model_config, data_info } = results
+  const { test_metrics, training_results, model_config, data_info, load_test } = results
   const perfData = [
     { metric: "Accuracy", value: test_metrics.accuracy * 100 },
     { metric: "Precision", value: test_metrics.precision * 100 },
@@ -159,6 +187,52 @@ export default function ModelMetrics() {
         </Card>
       </div>
 
+      {/* Load Test SLO Report */}
+      {load_test && (
+        <Card>
+          <CardHeader>
+            <CardTitle>Load Test</CardTitle>
+            <CardDescription>
+              Open-loop Poisson load against {load_test.endpoint} (SLO: p99 ≤ {load_test.slo.p99_ms} ms,
+              errors ≤ {(load_test.slo.max_error_rate * 100).toFixed(1)}%)
+            </CardDescription>
+          </CardHeader>
+          <CardContent>
+            <p className="mb-4 text-sm">
+              {load_test.saturation_point
+                ? `Saturation point: ${load_test.saturation_point.max_sustainable_rate} req/s at concurrency ${load_test.saturation_point.concurrency} (p99 ${formatMs(load_test.saturation_point.p99_ms_at_max)} ms)`
+                : "No rate level met the SLO"}
+            </p>
+            <table className="w-full text-center border text-sm">
+              <thead>
+                <tr>
+                  <th>Concurrency</th>
+                  <th>Offered (req/s)</th>
+                  <th>Throughput (req/s)</th>
+                  <th>p50 (ms)</th>
+                  <th>p99 (ms)</th>
+                  <th>p999 (ms)</th>
+                  <th>Errors</th>
+                </tr>
+              </thead>
+              <tbody>
+                {load_test.levels.map((level, index) => (
+                  <tr key={index}>
+                    <td>{level.concurrency}</td>
+                    <td>{level.offered_rate}</td>
+                    <td>{level.throughput.toFixed(1)}</td>
+                    <td>{formatMs(level.latency.p50_ms)}</td>
+                    <td>{formatMs(level.latency.p99_ms)}</td>
+                    <td>{formatMs(level.latency.p999_ms)}</td>
+                    <td>{(level.error_rate * 100).toFixed(1)}%</td>
+                  </tr>
+                ))}
+              </tbody>
+            </table>
+          </CardContent>
+        </Card>
+      )}
+
       {/* Model Architecture Info */}
       <Card>
         <CardHeader>
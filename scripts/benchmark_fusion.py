@@ -0,0 +1,97 @@
+"""
+CPU latency/throughput benchmark for RoBERTaNET fusion variants and encoder attention kernels
+Compares the original 'attention' fusion on eager attention with the SDPA token-level fusion path
+"""
+
+import argparse
+import json
+import statistics
+import time
+from typing import Dict, List
+
+import torch
+
+from model_architecture import create_model
+
+VARIANTS = [
+    {'name': 'attention/eager', 'fusion_method': 'attention', 'attn_implementation': 'eager'},
+    {'name': 'attention/sdpa', 'fusion_method': 'attention', 'attn_implementation': 'sdpa'},
+    {'name': 'token_attention/sdpa', 'fusion_method': 'token_attention', 'attn_implementation': 'sdpa'},
+]
+
+def time_forward(model, batch_size: int, seq_len: int, vocab_size: int,
+                 warmup: int, iterations: int) -> List[float]:
+    """Return per-iteration forward latencies in seconds for random inputs"""
+    input_ids = torch.randint(3, 1000, (batch_size, seq_len))
+    attention_mask = torch.ones(batch_size, seq_len, dtype=torch.long)
+    glove_input_ids = torch.randint(4, vocab_size, (batch_size, seq_len))
+    # Pad the second half of the GloVe sequence as real batches would be
+    glove_input_ids[:, seq_len // 2:] = 0
+
+    latencies = []
+    with torch.inference_mode():
+        for i in range(warmup + iterations):
+            start = time.perf_counter()
+            model(input_ids, attention_mask, glove_input_ids)
+            if i >= warmup:
+                latencies.append(time.perf_counter() - start)
+    return latencies
+
+def run_benchmark(batch_sizes: List[int], seq_lens: List[int], vocab_size: int,
+                  warmup: int, iterations: int) -> List[Dict]:
+    """Benchmark every variant over a grid of batch sizes and sequence lengths"""
+    results = []
+    for variant in VARIANTS:
+        model = create_model({
+            'vocab_size': vocab_size,
+            'fusion_method': variant['fusion_method'],
+            'attn_implementation': variant['attn_implementation'],
+            'pretrained': False
+        })
+        model.eval()
+
+        for seq_len in seq_lens:
+            for batch_size in batch_sizes:
+                latencies = time_forward(model, batch_size, seq_len, vocab_size, warmup, iterations)
+                median = statistics.median(latencies)
+                result = {
+                    'variant': variant['name'],
+                    'attn_implementation': model.attn_implementation,
+                    'batch_size': batch_size,
+                    'seq_len': seq_len,
+                    'median_latency_ms': median * 1000,
+                    'p90_latency_ms': sorted(latencies)[int(0.9 * (len(latencies) - 1))] * 1000,
+                    'samples_per_second': batch_size / median
+                }
+                results.append(result)
+                print(f"  {variant['name']:<22} seq {seq_len:>4} batch {batch_size:>3}: "
+                      f"{result['median_latency_ms']:8.2f} ms, {result['samples_per_second']:8.1f} samples/s")
+    return results
+
+def main():
+    """Main benchmark function"""
+    parser = argparse.ArgumentParser(description='Benchmark RoBERTaNET fusion/attention variants on CPU')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--seq-lens', type=int, nargs='+', default=[64, 128])
+    parser.add_argument('--vocab-size', type=int, default=50000)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--output', default='fusion_benchmark.json')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    print("RoBERTaNET Fusion Benchmark (CPU)")
+    print("=" * 50)
+    print(f"torch {torch.__version__}, {torch.get_num_threads()} threads")
+
+    results = run_benchmark(args.batch_sizes, args.seq_lens, args.vocab_size, args.warmup, args.iterations)
+
+    with open(args.output, 'w') as f:
+        json.dump({'torch_version': torch.__version__, 'threads': torch.get_num_threads(), 'results': results}, f, indent=2)
+    print(f"\nBenchmark results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
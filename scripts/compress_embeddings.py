@@ -0,0 +1,129 @@
+"""
+GloVe embedding table compression for RoBERTaNET
+Prunes vocabulary rows never seen in the training corpus, stores the table as
+fp16, row-wise int8 or product-quantized codes, and checks accuracy parity
+"""
+
+import argparse
+import json
+import os
+from typing import Dict
+
+import torch
+
+from model_architecture import GLOVE_STORAGE_TYPES, RoBERTaNET, create_model, load_model_from_checkpoint
+from data_preprocessing import (TextPreprocessor, create_sample_dataset, expand_shards, iter_split_records,
+                                load_vocab, prepare_data, prune_vocabulary)
+from model_evaluation import ModelEvaluator
+from train_model import ModelTrainer
+
+def evaluate(model: RoBERTaNET, data_loader, device: str = 'cpu') -> Dict:
+    """Accuracy and weighted F1 on a loader"""
+    evaluator = ModelEvaluator(model, device=device)
+    y_true, y_pred, y_prob = evaluator.predict(data_loader)
+    metrics = evaluator.compute_metrics(y_true, y_pred, y_prob)
+    return {'accuracy': metrics['accuracy'], 'f1_weighted': metrics['f1_weighted']}
+
+def main():
+    """Main compression function"""
+    parser = argparse.ArgumentParser(description='Compress the RoBERTaNET GloVe embedding table')
+    parser.add_argument('--checkpoint', default='robertanet_best_model.pth')
+    parser.add_argument('--vocab', default='robertanet_vocab.json',
+                        help='Vocabulary the checkpoint was trained with')
+    parser.add_argument('--storage', choices=GLOVE_STORAGE_TYPES, default='int8')
+    parser.add_argument('--pq-subvectors', type=int, default=30)
+    parser.add_argument('--pq-centroids', type=int, default=256)
+    parser.add_argument('--no-prune', action='store_true', help='Keep rows unseen in the training corpus')
+    parser.add_argument('--data', nargs='+', default=None,
+                        help='Shards (or globs) the checkpoint was trained on; rows unseen in their train split '
+                             'are pruned (default: ROBERTANET_DATA, as in train_model.py)')
+    parser.add_argument('--max-length', type=int, default=128)
+    parser.add_argument('--output', default='robertanet_compressed_model.pth')
+    parser.add_argument('--vocab-output', default='robertanet_compressed_vocab.json')
+    args = parser.parse_args()
+    if args.data is None and os.environ.get('ROBERTANET_DATA'):
+        args.data = os.environ['ROBERTANET_DATA'].split(',')
+
+    print("RoBERTaNET GloVe Compression")
+    print("=" * 50)
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    print("\n1. Loading data and model...")
+    df = create_sample_dataset()
+    train_loader, val_loader, test_loader, data_info = prepare_data(df, max_length=args.max_length)
+    if os.path.exists(args.checkpoint):
+        # Rows of the checkpoint's table follow the vocabulary it was trained with
+        model, _ = load_model_from_checkpoint(args.checkpoint, device=device)
+        vocab = load_vocab(args.vocab)
+    else:
+        print(f"Checkpoint {args.checkpoint} not found; compressing an untrained model")
+        model = create_model({'vocab_size': data_info['vocab_size'], 'num_classes': data_info['num_classes'],
+                              'max_length': args.max_length})
+        vocab = data_info['vocab']
+
+    glove = model.glove_embedding
+    if len(vocab) != glove.vocab_size:
+        raise ValueError(f"Vocabulary {args.vocab} has {len(vocab)} words but the GloVe table has "
+                         f"{glove.vocab_size} rows; pass the vocabulary the checkpoint was trained with")
+    # Evaluate with the checkpoint's vocabulary, not the one rebuilt from the sample split
+    for loader in (train_loader, val_loader, test_loader):
+        loader.dataset.vocab = vocab
+    original_rows = glove.vocab_size
+    original_bytes = glove.table_bytes()
+    baseline = evaluate(model, test_loader, device)
+
+    if not args.no_prune:
+        print("\n2. Pruning rows unseen in the training corpus...")
+        if args.data:
+            # Stream the train split of the corpus the checkpoint was trained on
+            files = expand_shards(args.data)
+            if not files:
+                raise ValueError(f"No shard files matched {args.data}")
+            preprocessor = TextPreprocessor()
+            corpus = (preprocessor.clean_text(record.get('text')) for record in iter_split_records(files, 'train'))
+        elif os.path.exists(args.checkpoint):
+            # Pruning against the sample split would drop nearly every row of a real vocabulary
+            raise ValueError("Pass --data (or set ROBERTANET_DATA) with the checkpoint's training shards, "
+                             "or --no-prune")
+        else:
+            corpus = train_loader.dataset.texts
+        vocab, keep_ids = prune_vocabulary(vocab, corpus)
+        glove.prune_rows(keep_ids)
+        for loader in (train_loader, val_loader, test_loader):
+            loader.dataset.vocab = vocab
+
+    print(f"\n3. Compressing table to {args.storage}...")
+    glove.pq_subvectors = args.pq_subvectors
+    glove.pq_centroids = args.pq_centroids
+    glove.compress(args.storage)
+    glove.freeze()
+    compressed = evaluate(model, test_loader, device)
+
+    # Save the compressed checkpoint and its vocabulary
+    trainer = ModelTrainer(model, device=device)
+    trainer.save_checkpoint(args.output, glove_compression={
+        'storage': args.storage,
+        'original_rows': original_rows,
+        'rows': glove.vocab_size,
+        'original_table_bytes': original_bytes,
+        'table_bytes': glove.table_bytes(),
+        'baseline_metrics': baseline,
+        'compressed_metrics': compressed
+    })
+    with open(args.vocab_output, 'w') as f:
+        json.dump(vocab, f)
+
+    print(f"\nCompression Results:")
+    print(f"Rows: {original_rows:,} -> {glove.vocab_size:,}")
+    print(f"Table memory: {original_bytes / 1024 ** 2:.2f} MB -> {glove.table_bytes() / 1024 ** 2:.2f} MB "
+          f"({original_bytes / max(glove.table_bytes(), 1):.1f}x smaller)")
+    if os.path.exists(args.checkpoint):
+        print(f"Checkpoint size: {os.path.getsize(args.checkpoint) / 1024 ** 2:.1f} MB -> "
+              f"{os.path.getsize(args.output) / 1024 ** 2:.1f} MB")
+    print(f"Accuracy: {baseline['accuracy']:.4f} -> {compressed['accuracy']:.4f}")
+    print(f"Weighted F1: {baseline['f1_weighted']:.4f} -> {compressed['f1_weighted']:.4f}")
+    print(f"Compressed checkpoint saved to {args.output}, vocabulary to {args.vocab_output}")
+
+if __name__ == "__main__":
+    main()
@@ -7,12 +7,17 @@ import pandas as pd
 import numpy as np
 import re
 import torch
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, IterableDataset, get_worker_info
 from transformers import RobertaTokenizer
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterator
+from collections import Counter
+import glob
+import hashlib
 import json
+import math
+import random
 
 class TextPreprocessor:
     """Text preprocessing utilities for cyberbullying detection"""
@@ -21,6 +26,7 @@ class TextPreprocessor:
         self.url_pattern = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\$$\$$,]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
         self.mention_pattern = re.compile(r'@[A-Za-z0-9_]+')
         self.hashtag_pattern = re.compile(r'#[A-Za-z0-9_]+')
+        self.whitespace_pattern = re.compile(r'\s+')
         
     def clean_text(self, text: str) -> str:
         """Clean and normalize text"""
@@ -43,7 +49,49 @@ class TextPreprocessor:
         text = re.sub(r'\s+', ' ', text).strip()
         
         return text
-    
+
+    @staticmethod
+    def _sub_with_offsets(pattern, replacement: str, text: str,
+                          offsets: List[Tuple[int, int]]) -> Tuple[str, List[Tuple[int, int]]]:
+        """re.sub that keeps a per-character map back to the original text"""
+        pieces = []
+        new_offsets = []
+        pos = 0
+        for match in pattern.finditer(text):
+            pieces.append(text[pos:match.start()])
+            new_offsets.extend(offsets[pos:match.start()])
+            span = (offsets[match.start()][0], offsets[match.end() - 1][1])
+            pieces.append(replacement)
+            new_offsets.extend([span] * len(replacement))
+            pos = match.end()
+        pieces.append(text[pos:])
+        new_offsets.extend(offsets[pos:])
+        return ''.join(pieces), new_offsets
+
+    def clean_text_with_offsets(self, text: str) -> Tuple[str, List[Tuple[int, int]]]:
+        """Clean text like clean_text, also returning (start, end) offsets in the original for each character"""
+        if not isinstance(text, str):
+            return "", []
+
+        # Lowercase character by character so every output char keeps its source index
+        chars = []
+        offsets = []
+        for idx, char in enumerate(text):
+            lowered = char.lower()
+            chars.append(lowered)
+            offsets.extend([(idx, idx + 1)] * len(lowered))
+        cleaned = ''.join(chars)
+
+        cleaned, offsets = self._sub_with_offsets(self.url_pattern, ' [URL] ', cleaned, offsets)
+        cleaned, offsets = self._sub_with_offsets(self.mention_pattern, ' [USER] ', cleaned, offsets)
+        cleaned, offsets = self._sub_with_offsets(self.hashtag_pattern, ' [HASHTAG] ', cleaned, offsets)
+        cleaned, offsets = self._sub_with_offsets(self.whitespace_pattern, ' ', cleaned, offsets)
+
+        # Strip leading/trailing whitespace
+        start = len(cleaned) - len(cleaned.lstrip())
+        end = len(cleaned.rstrip())
+        return cleaned[start:end], offsets[start:end]
+
     def create_vocabulary(self, texts: List[str], min_freq: int = 2) -> Dict[str, int]:
         """Create vocabulary from text corpus"""
         word_counts = {}
@@ -85,32 +133,85 @@ class CyberbullyingDataset(Dataset):
         return len(self.texts)
     
     def __getitem__(self, idx):
-        text = self.texts[idx]
-        label = self.labels[idx]
-        
-        # RoBERTa tokenization
-        roberta_encoding = self.tokenizer(
-            text,
-            truncation=True,
-            padding='max_length',
-            max_length=self.max_length,
-            return_tensors='pt'
-        )
-        
-        # GloVe tokenization (word-level)
-        words = text.split()[:self.max_length]
-        glove_ids = [self.vocab.get(word, self.vocab['<UNK>']) for word in words]
-        
-        # Pad GloVe sequence
-        while len(glove_ids) < self.max_length:
-            glove_ids.append(self.vocab['<PAD>'])
+        return encode_example(self.texts[idx], self.labels[idx], self.tokenizer, self.vocab, self.max_length)
+
+def encode_example(text: str,
+                   label: int,
+                   tokenizer: RobertaTokenizer,
+                   vocab: Dict[str, int],
+                   max_length: int = 512) -> Dict[str, torch.Tensor]:
+    """Tokenize one cleaned text for both the RoBERTa and GloVe branches"""
+    
+    # RoBERTa tokenization
+    roberta_encoding = tokenizer(
+        text,
+        truncation=True,
+        padding='max_length',
+        max_length=max_length,
+        return_tensors='pt'
+    )
+    
+    # GloVe tokenization (word-level)
+    words = text.split()[:max_length]
+    glove_ids = [vocab.get(word, vocab['<UNK>']) for word in words]
+    
+    # Pad GloVe sequence
+    while len(glove_ids) < max_length:
+        glove_ids.append(vocab['<PAD>'])
+    
+    return {
+        'input_ids': roberta_encoding['input_ids'].squeeze(),
+        'attention_mask': roberta_encoding['attention_mask'].squeeze(),
+        'glove_input_ids': torch.tensor(glove_ids, dtype=torch.long),
+        'labels': torch.tensor(label, dtype=torch.long)
+    }
+
+class TensorDictDataset(Dataset):
+    """Dataset over pre-tokenized tensors, yielding the same dicts as CyberbullyingDataset"""
+    
+    def __init__(self, tensors: Dict[str, torch.Tensor]):
+        self.tensors = tensors
+        self.length = len(tensors['labels'])
         
-        return {
-            'input_ids': roberta_encoding['input_ids'].squeeze(),
-            'attention_mask': roberta_encoding['attention_mask'].squeeze(),
-            'glove_input_ids': torch.tensor(glove_ids, dtype=torch.long),
-            'labels': torch.tensor(label, dtype=torch.long)
-        }
+    def __len__(self):
+        return self.length
+    
+    def __getitem__(self, idx):
+        return {key: value[idx] for key, value in self.tensors.items()}
+
+def tokenize_dataset(dataset: Dataset) -> Dict[str, torch.Tensor]:
+    """Materialize a dataset (map-style or streaming) into stacked tensors for caching"""
+    if isinstance(dataset, IterableDataset):
+        items = list(dataset)
+    else:
+        items = [dataset[i] for i in range(len(dataset))]
+    return {key: torch.stack([item[key] for item in items]) for key in items[0]}
+
+def prune_vocabulary(vocab: Dict[str, int], texts: List[str]) -> Tuple[Dict[str, int], List[int]]:
+    """Drop words that never occur in texts; returns the renumbered vocab and the kept old ids"""
+    seen = set()
+    for text in texts:
+        seen.update(text.split())
+    
+    # Special tokens always survive; kept words keep their relative order
+    kept = [(word, idx) for word, idx in sorted(vocab.items(), key=lambda item: item[1])
+            if word.startswith('<') and word.endswith('>') or word in seen]
+    new_vocab = {word: new_idx for new_idx, (word, _) in enumerate(kept)}
+    keep_ids = [old_idx for _, old_idx in kept]
+    
+    print(f"Vocabulary pruned from {len(vocab)} to {len(new_vocab)} words")
+    return new_vocab, keep_ids
+
+def load_vocab(path: str) -> Dict[str, int]:
+    """Load a GloVe vocabulary from a vocab JSON file or an older training results file"""
+    with open(path, 'r') as f:
+        data = json.load(f)
+    
+    if 'data_info' in data:
+        return data['data_info']['vocab']
+    if 'vocab' in data:
+        return data['vocab']
+    return data
 
 def create_sample_dataset() -> pd.DataFrame:
     """Create a sample cyberbullying dataset for demonstration"""
@@ -206,6 +307,233 @@ def prepare_data(df: pd.DataFrame,
     
     return train_loader, val_loader, test_loader, data_info
 
+def iter_records(path: str, chunk_size: int = 10000) -> Iterator[Dict]:
+    """Lazily yield records from a JSONL, CSV or Parquet file"""
+    if path.endswith('.jsonl') or path.endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    elif path.endswith('.csv'):
+        for chunk in pd.read_csv(path, chunksize=chunk_size):
+            yield from chunk.to_dict('records')
+    elif path.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Reading Parquet shards requires pyarrow: pip install pyarrow")
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield from batch.to_pylist()
+    else:
+        raise ValueError(f"Unsupported shard format: {path}")
+
+def split_key(record: Dict, text_field: str = 'text', id_field: str = 'id'):
+    """Value a record is split on: its id, or its text when the id is missing (None or NaN, e.g. empty CSV cells)"""
+    record_id = record.get(id_field)
+    if record_id is None or (isinstance(record_id, float) and math.isnan(record_id)):
+        return record.get(text_field)
+    return record_id
+
+def assign_split(record_id: str, val_size: float = 0.1, test_size: float = 0.2) -> str:
+    """Deterministically assign a record to train/val/test by hashing its id"""
+    digest = hashlib.md5(str(record_id).encode('utf-8')).digest()
+    bucket = int.from_bytes(digest[:8], 'big') / 2 ** 64
+    if bucket < test_size:
+        return 'test'
+    if bucket < test_size + val_size:
+        return 'val'
+    return 'train'
+
+def expand_shards(paths: List[str]) -> List[str]:
+    """Expand glob patterns into a sorted list of shard files"""
+    files = []
+    for pattern in paths:
+        files.extend(sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern])
+    return files
+
+class StreamingCyberbullyingDataset(IterableDataset):
+    """
+    Streams records from sharded files, cleaning and tokenizing on the fly.
+    
+    Each record lands in train/val/test by a hash of its id, so no global
+    split is needed, and a bounded shuffle buffer replaces global shuffling.
+    Memory stays flat regardless of corpus size.
+    """
+    
+    def __init__(self,
+                 files: List[str],
+                 split: str,
+                 tokenizer: RobertaTokenizer,
+                 vocab: Dict[str, int],
+                 max_length: int = 512,
+                 val_size: float = 0.1,
+                 test_size: float = 0.2,
+                 text_field: str = 'text',
+                 label_field: str = 'label',
+                 id_field: str = 'id',
+                 shuffle_buffer: int = 0,
+                 seed: int = 42):
+        
+        self.files = files
+        self.split = split
+        self.tokenizer = tokenizer
+        self.vocab = vocab
+        self.max_length = max_length
+        self.val_size = val_size
+        self.test_size = test_size
+        self.text_field = text_field
+        self.label_field = label_field
+        self.id_field = id_field
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.epoch = 0
+        self.preprocessor = TextPreprocessor()
+        
+    def set_epoch(self, epoch: int):
+        """Reseed the shuffle buffer for a new epoch"""
+        self.epoch = epoch
+        
+    def _iter_split_records(self, worker_id: int, num_workers: int) -> Iterator[Dict]:
+        # Shard by file when there are enough files, otherwise by record position
+        shard_by_file = len(self.files) >= num_workers
+        files = self.files[worker_id::num_workers] if shard_by_file else self.files
+        
+        position = 0
+        for path in files:
+            for record in iter_records(path):
+                if not shard_by_file:
+                    position += 1
+                    if position % num_workers != worker_id:
+                        continue
+                record_id = split_key(record, self.text_field, self.id_field)
+                if assign_split(record_id, self.val_size, self.test_size) == self.split:
+                    yield record
+                    
+    def _shuffle(self, records: Iterator[Dict], rng: random.Random) -> Iterator[Dict]:
+        buffer = []
+        for record in records:
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(record)
+                continue
+            idx = rng.randrange(len(buffer))
+            yield buffer[idx]
+            buffer[idx] = record
+        rng.shuffle(buffer)
+        yield from buffer
+        
+    def __iter__(self):
+        worker_info = get_worker_info()
+        worker_id = worker_info.id if worker_info is not None else 0
+        num_workers = worker_info.num_workers if worker_info is not None else 1
+        
+        records = self._iter_split_records(worker_id, num_workers)
+        if self.shuffle_buffer > 0:
+            rng = random.Random(f"{self.seed}-{self.epoch}-{worker_id}")
+            records = self._shuffle(records, rng)
+        
+        for record in records:
+            text = self.preprocessor.clean_text(record.get(self.text_field))
+            label = int(record[self.label_field])
+            yield encode_example(text, label, self.tokenizer, self.vocab, self.max_length)
+
+def iter_split_records(files: List[str],
+                       split: str = 'train',
+                       val_size: float = 0.1,
+                       test_size: float = 0.2,
+                       text_field: str = 'text',
+                       id_field: str = 'id') -> Iterator[Dict]:
+    """Stream the records of one hash split from sharded files"""
+    for path in files:
+        for record in iter_records(path):
+            if assign_split(split_key(record, text_field, id_field), val_size, test_size) == split:
+                yield record
+
+def build_streaming_vocabulary(files: List[str],
+                               min_freq: int = 2,
+                               val_size: float = 0.1,
+                               test_size: float = 0.2,
+                               text_field: str = 'text',
+                               label_field: str = 'label',
+                               id_field: str = 'id') -> Tuple[Dict[str, int], Counter]:
+    """Build the GloVe vocabulary and count train-split labels in one streaming pass"""
+    preprocessor = TextPreprocessor()
+    word_counts = Counter()
+    label_counts = Counter()
+    
+    for record in iter_split_records(files, 'train', val_size, test_size, text_field, id_field):
+        word_counts.update(preprocessor.clean_text(record.get(text_field)).split())
+        label_counts[int(record[label_field])] += 1
+    
+    vocab = {'<PAD>': 0, '<UNK>': 1, '<START>': 2, '<END>': 3}
+    for word, count in word_counts.items():
+        if count >= min_freq:
+            vocab[word] = len(vocab)
+    
+    print(f"Vocabulary created with {len(vocab)} words")
+    return vocab, label_counts
+
+def prepare_streaming_data(paths: List[str],
+                           vocab: Optional[Dict[str, int]] = None,
+                           num_classes: Optional[int] = None,
+                           test_size: float = 0.2,
+                           val_size: float = 0.1,
+                           max_length: int = 512,
+                           batch_size: int = 16,
+                           num_workers: int = 2,
+                           shuffle_buffer: int = 10000,
+                           **record_fields) -> Tuple[DataLoader, DataLoader, DataLoader, Dict]:
+    """
+    Prepare streaming data loaders over sharded JSONL/CSV/Parquet files.
+    Without num_classes, it is taken from the labels seen in the train split.
+    """
+    
+    files = expand_shards(paths)
+    if not files:
+        raise ValueError(f"No shard files matched {paths}")
+    
+    tokenizer = RobertaTokenizer.from_pretrained('roberta-base')
+    fields = {k: v for k, v in record_fields.items() if k in ('text_field', 'label_field', 'id_field')}
+    label_counts = None
+    if vocab is None:
+        vocab, label_counts = build_streaming_vocabulary(files, val_size=val_size, test_size=test_size, **fields)
+    if num_classes is None:
+        if label_counts is None:
+            # Vocabulary given, so count labels in a pass of their own
+            label_field = fields.pop('label_field', 'label')
+            label_counts = Counter(
+                int(record[label_field])
+                for record in iter_split_records(files, 'train', val_size, test_size, **fields)
+            )
+        if not label_counts:
+            raise ValueError(f"No training records found in {paths}")
+        # Labels are class indices, so a class missing from the train split still gets an output
+        num_classes = max(label_counts) + 1
+    
+    def make_loader(split: str, buffer: int) -> DataLoader:
+        dataset = StreamingCyberbullyingDataset(
+            files, split, tokenizer, vocab, max_length,
+            val_size=val_size, test_size=test_size,
+            shuffle_buffer=buffer, **record_fields
+        )
+        return DataLoader(dataset, batch_size=batch_size, num_workers=num_workers)
+    
+    train_loader = make_loader('train', shuffle_buffer)
+    val_loader = make_loader('val', 0)
+    test_loader = make_loader('test', 0)
+    
+    data_info = {
+        'vocab_size': len(vocab),
+        'num_classes': num_classes,
+        'num_shards': len(files),
+        'vocab': vocab
+    }
+    
+    print(f"Streaming data prepared over {len(files)} shards")
+    
+    return train_loader, val_loader, test_loader, data_info
+
 if __name__ == "__main__":
     # Test data preprocessing
     print("Testing data preprocessing pipeline...")
@@ -0,0 +1,300 @@
+"""
+Batched token attributions for flagged RoBERTaNET predictions
+Integrated gradients over the RoBERTa word embeddings and GloVe vectors, with every
+interpolation step of every text packed into shared batches and run off the serving path
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import torch
+from transformers import RobertaTokenizer
+
+from model_architecture import RoBERTaNET, create_model, load_model_from_checkpoint
+from data_preprocessing import TextPreprocessor, create_sample_dataset, load_vocab
+from long_text_inference import create_long_text_scorer
+
+class TokenAttributionEngine:
+    """Integrated-gradients attributions for many texts in one batched pass"""
+
+    def __init__(self,
+                 model: RoBERTaNET,
+                 tokenizer: RobertaTokenizer,
+                 vocab: Dict[str, int],
+                 device: str = 'cpu',
+                 steps: int = 16,
+                 max_batch_rows: int = 64,
+                 max_length: Optional[int] = None,
+                 target_class: int = 1):
+
+        self.model = model.to(device)
+        self.model.eval()
+        self.tokenizer = tokenizer
+        self.vocab = vocab
+        self.device = device
+        self.steps = steps
+        self.max_batch_rows = max_batch_rows
+        # Defaults to the training length so GloVe padding matches training
+        self.max_length = max_length or model.max_length
+        self.target_class = target_class
+        self.preprocessor = TextPreprocessor()
+        self._baseline_cache: Dict[str, torch.Tensor] = {}
+
+    def reset_baselines(self):
+        """Drop cached baselines, e.g. after new weights are loaded"""
+        self._baseline_cache.clear()
+
+    def _baseline_vectors(self) -> Dict[str, torch.Tensor]:
+        """Cached embeddings of the baseline tokens: RoBERTa <pad> and GloVe <PAD>"""
+        if not self._baseline_cache:
+            with torch.no_grad():
+                pad_id = torch.tensor([self.tokenizer.pad_token_id], device=self.device)
+                glove_pad_id = torch.tensor([self.vocab['<PAD>']], device=self.device)
+                self._baseline_cache['roberta'] = self.model.roberta.embeddings.word_embeddings(pad_id)[0]
+                self._baseline_cache['glove'] = self.model.glove_embedding(glove_pad_id)[0]
+        return self._baseline_cache
+
+    def _encode(self, texts: List[str]) -> Dict:
+        cleaned = [self.preprocessor.clean_text(text) for text in texts]
+        encoding = self.tokenizer(
+            cleaned,
+            truncation=True,
+            padding=True,
+            max_length=self.max_length,
+            return_tensors='pt'
+        )
+        # GloVe ids are padded to max_length as in training; the branch averages over <PAD> too
+        words = [text.split()[:self.max_length] for text in cleaned]
+        glove_ids = torch.full((len(texts), self.max_length), self.vocab['<PAD>'], dtype=torch.long)
+        for i, text_words in enumerate(words):
+            if text_words:
+                glove_ids[i, :len(text_words)] = torch.tensor(
+                    [self.vocab.get(word, self.vocab['<UNK>']) for word in text_words]
+                )
+
+        special_ids = torch.tensor(self.tokenizer.all_special_ids)
+        return {
+            'input_ids': encoding['input_ids'].to(self.device),
+            'attention_mask': encoding['attention_mask'].to(self.device),
+            'special_mask': torch.isin(encoding['input_ids'], special_ids).to(self.device),
+            'glove_input_ids': glove_ids.to(self.device),
+            'words': words
+        }
+
+    def explain(self, texts: List[str]) -> List[Dict]:
+        """Attribute the target-class logit of each text to its RoBERTa tokens and GloVe words"""
+        start_time = time.perf_counter()
+        batch = self._encode(texts)
+        baselines = self._baseline_vectors()
+        num_texts = len(texts)
+
+        with torch.no_grad():
+            roberta_inputs = self.model.roberta.embeddings.word_embeddings(batch['input_ids'])
+            glove_inputs = self.model.glove_embedding(batch['glove_input_ids'])
+
+        # Baselines keep <s>, </s> and padding; content tokens become <pad> / <PAD>
+        roberta_baseline = torch.where(batch['special_mask'].unsqueeze(-1), roberta_inputs,
+                                       baselines['roberta'].expand_as(roberta_inputs))
+        glove_baseline = baselines['glove'].expand_as(glove_inputs)
+
+        # Midpoint Riemann sum over the straight-line path
+        alphas = (torch.arange(self.steps, device=self.device, dtype=torch.float32) + 0.5) / self.steps
+
+        # Rows are (text, step) pairs, flattened so all texts share batches
+        row_text = torch.arange(num_texts, device=self.device).repeat_interleave(self.steps)
+        row_alpha = alphas.repeat(num_texts)
+
+        roberta_grads = torch.zeros_like(roberta_inputs)
+        glove_grads = torch.zeros_like(glove_inputs)
+
+        for start in range(0, len(row_text), self.max_batch_rows):
+            text_idx = row_text[start:start + self.max_batch_rows]
+            alpha = row_alpha[start:start + self.max_batch_rows].view(-1, 1, 1)
+
+            roberta_path = (roberta_baseline[text_idx] + alpha * (roberta_inputs[text_idx] - roberta_baseline[text_idx])).requires_grad_(True)
+            glove_path = (glove_baseline[text_idx] + alpha * (glove_inputs[text_idx] - glove_baseline[text_idx])).requires_grad_(True)
+
+            logits = self.model(
+                None,
+                batch['attention_mask'][text_idx],
+                batch['glove_input_ids'][text_idx],
+                inputs_embeds=roberta_path,
+                glove_embeds=glove_path
+            )
+            roberta_grad, glove_grad = torch.autograd.grad(
+                logits[:, self.target_class].sum(), [roberta_path, glove_path]
+            )
+            roberta_grads.index_add_(0, text_idx, roberta_grad.detach())
+            glove_grads.index_add_(0, text_idx, glove_grad.detach())
+
+        roberta_attr = ((roberta_inputs - roberta_baseline) * roberta_grads / self.steps).sum(dim=-1)
+        glove_attr = ((glove_inputs - glove_baseline) * glove_grads / self.steps).sum(dim=-1)
+
+        elapsed = time.perf_counter() - start_time
+        explanations = []
+        for i in range(num_texts):
+            length = int(batch['attention_mask'][i].sum())
+            tokens = self.tokenizer.convert_ids_to_tokens(batch['input_ids'][i, :length].tolist())
+            num_words = len(batch['words'][i])
+            explanations.append({
+                'roberta_tokens': [
+                    {'token': token, 'attribution': float(score)}
+                    for token, score in zip(tokens, roberta_attr[i, :length].tolist())
+                ],
+                'glove_words': [
+                    {'word': word, 'attribution': float(score)}
+                    for word, score in zip(batch['words'][i], glove_attr[i, :num_words].tolist())
+                ],
+                'cost': {
+                    'seconds': elapsed / num_texts,
+                    'interpolation_steps': self.steps,
+                    'batch_texts': num_texts
+                }
+            })
+        return explanations
+
+class ExplanationService:
+    """
+    Background worker that explains high-risk items asynchronously.
+
+    With log_path set, every finished explanation is appended there as a JSON line.
+    At most `max_queue` items wait; beyond that items are dropped and counted in `dropped`.
+    Hold `lock` while changing the engine's weights.
+    """
+
+    def __init__(self,
+                 engine: TokenAttributionEngine,
+                 risk_threshold: float = 0.7,
+                 max_batch_texts: int = 8,
+                 log_path: Optional[str] = None,
+                 max_queue: int = 64):
+        self.engine = engine
+        self.risk_threshold = risk_threshold
+        self.max_batch_texts = max_batch_texts
+        self.log_path = log_path
+        self.lock = threading.Lock()
+        self.queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self,
+               texts: List[str],
+               bullying_probabilities: List[float],
+               spans: Optional[List[Dict]] = None) -> List[Optional[Future]]:
+        """
+        Queue items above the risk threshold; returns a Future per item
+        (None if below the threshold or dropped because the queue is full).
+        `spans` optionally gives, per item, the character offsets it was cut from; they are logged.
+        """
+        futures = []
+        spans = spans or [None] * len(texts)
+        for text, probability, span in zip(texts, bullying_probabilities, spans):
+            if probability < self.risk_threshold:
+                futures.append(None)
+                continue
+            future = Future()
+            try:
+                self.queue.put_nowait((text, probability, span, future))
+            except queue.Full:
+                # Explanations are best-effort; never block the request path on them
+                with self._dropped_lock:
+                    self.dropped += 1
+                future = None
+            futures.append(future)
+        return futures
+
+    def _run(self):
+        while True:
+            items = [self.queue.get()]
+            while len(items) < self.max_batch_texts:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                with self.lock:
+                    explanations = self.engine.explain([text for text, _, _, _ in items])
+            except Exception as e:
+                for _, _, _, future in items:
+                    future.set_exception(e)
+                continue
+
+            if self.log_path:
+                self._log(items, explanations)
+            for (_, _, _, future), explanation in zip(items, explanations):
+                future.set_result(explanation)
+
+    def _log(self, items: List, explanations: List[Dict]):
+        with open(self.log_path, 'a') as f:
+            for (text, probability, span, _), explanation in zip(items, explanations):
+                f.write(json.dumps({
+                    'timestamp': datetime.now().isoformat(),
+                    'text': text,
+                    'span': span,
+                    'bullying_probability': probability,
+                    'top_tokens': top_tokens(explanation),
+                    'explanation': explanation
+                }) + "\n")
+
+def top_tokens(explanation: Dict, k: int = 5) -> List[Dict]:
+    """Highest-attribution RoBERTa tokens, ignoring special tokens"""
+    tokens = [t for t in explanation['roberta_tokens'] if t['token'] not in ('<s>', '</s>', '<pad>')]
+    return sorted(tokens, key=lambda t: t['attribution'], reverse=True)[:k]
+
+def main():
+    """Explain flagged predictions on the sample dataset"""
+    parser = argparse.ArgumentParser(description='Token attributions for flagged RoBERTaNET predictions')
+    parser.add_argument('--checkpoint', default='robertanet_best_model.pth')
+    parser.add_argument('--vocab', default='robertanet_vocab.json')
+    parser.add_argument('--steps', type=int, default=16)
+    parser.add_argument('--risk-threshold', type=float, default=0.7)
+    args = parser.parse_args()
+
+    print("RoBERTaNET Prediction Explanations")
+    print("=" * 50)
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    df = create_sample_dataset()
+    texts = df['text'].tolist()
+
+    if os.path.exists(args.checkpoint):
+        model, _ = load_model_from_checkpoint(args.checkpoint, device=device)
+        vocab = load_vocab(args.vocab)
+    else:
+        print(f"Checkpoint {args.checkpoint} not found; explaining an untrained model")
+        preprocessor = TextPreprocessor()
+        vocab = preprocessor.create_vocabulary([preprocessor.clean_text(t) for t in texts])
+        model = create_model({'vocab_size': len(vocab), 'num_classes': 2})
+
+    tokenizer = RobertaTokenizer.from_pretrained(model.roberta_model_name)
+    engine = TokenAttributionEngine(model, tokenizer, vocab, device=device, steps=args.steps)
+    service = ExplanationService(engine, risk_threshold=args.risk_threshold)
+
+    # Score with the serving scorer, then explain flagged items in the background
+    scorer = create_long_text_scorer(model, vocab, roberta_model=model.roberta_model_name, device=device)
+    probabilities = [result['bullying_probability'] for result in scorer.score(texts)]
+
+    futures = service.submit(texts, probabilities)
+    print(f"{sum(f is not None for f in futures)} of {len(texts)} items above risk threshold {args.risk_threshold}")
+
+    for text, probability, future in zip(texts, probabilities, futures):
+        if future is None:
+            continue
+        explanation = future.result()
+        tokens = ', '.join(f"{t['token']} ({t['attribution']:+.3f})" for t in top_tokens(explanation))
+        print(f"\n  Text: '{text[:50]}'  P(bullying)={probability:.3f}")
+        print(f"  Top tokens: {tokens}")
+        print(f"  Cost: {explanation['cost']['seconds'] * 1000:.1f} ms/item")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""
+Parallel hyper-parameter sweep for RoBERTaNET with asynchronous successive halving (ASHA)
+Trials share one tokenized data cache and are logged to a single SQLite store
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import multiprocessing
+import torch
+from torch.utils.data import DataLoader
+
+from model_architecture import create_model
+from data_preprocessing import (TensorDictDataset, create_sample_dataset, expand_shards, load_vocab, prepare_data,
+                                prepare_streaming_data, tokenize_dataset)
+from train_model import ModelTrainer
+
+DEFAULT_SEARCH_SPACE = {
+    'fusion_method': {'type': 'choice', 'values': ['concatenate', 'attention', 'token_attention']},
+    'dropout_rate': {'type': 'uniform', 'low': 0.1, 'high': 0.5},
+    'learning_rate': {'type': 'loguniform', 'low': 1e-5, 'high': 1e-4},
+    'glove_lr_multiplier': {'type': 'loguniform', 'low': 1.0, 'high': 20.0},
+    'classifier_lr_multiplier': {'type': 'loguniform', 'low': 1.0, 'high': 10.0}
+}
+
+def sample_config(search_space: Dict, rng: random.Random) -> Dict:
+    """Draw one configuration from a search space"""
+    config = {}
+    for name, spec in search_space.items():
+        kind = spec['type']
+        if kind == 'choice':
+            config[name] = rng.choice(spec['values'])
+        elif kind == 'uniform':
+            config[name] = rng.uniform(spec['low'], spec['high'])
+        elif kind == 'loguniform':
+            config[name] = math.exp(rng.uniform(math.log(spec['low']), math.log(spec['high'])))
+        elif kind == 'int':
+            config[name] = rng.randint(spec['low'], spec['high'])
+        else:
+            raise ValueError(f"Unknown search space type for {name}: {kind}")
+    return config
+
+def data_fingerprint(files: Optional[List[str]], vocab_path: Optional[str]) -> str:
+    """
+    Short hash of the data source and vocabulary: shard paths, sizes and mtimes
+    (or the sample dataset's texts) plus the vocabulary file's contents
+    """
+    digest = hashlib.sha1()
+    if files:
+        for path in files:
+            stat = os.stat(path)
+            digest.update(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode('utf-8'))
+    else:
+        df = create_sample_dataset()
+        digest.update(json.dumps([df['text'].tolist(), df['label'].tolist()]).encode('utf-8'))
+    if vocab_path:
+        # Otherwise the vocabulary is built from the data and already covered by its hash
+        with open(vocab_path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+def build_data_cache(cache_dir: str,
+                     max_length: int,
+                     data_paths: Optional[List[str]] = None,
+                     vocab_path: Optional[str] = None) -> str:
+    """
+    Tokenize the dataset once and store it for every trial to reuse.
+    data_paths are sharded files (or globs) as for train_model.py; without them
+    the sample dataset is used. The cache is keyed by max_length, data and vocabulary.
+    """
+    files = expand_shards(data_paths) if data_paths else None
+    if data_paths and not files:
+        raise ValueError(f"No shard files matched {data_paths}")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    fingerprint = data_fingerprint(files, vocab_path)
+    cache_path = os.path.join(cache_dir, f'tokenized_len{max_length}_{fingerprint}.pt')
+    if os.path.exists(cache_path):
+        print(f"Reusing tokenized data cache {cache_path}")
+        return cache_path
+
+    vocab = load_vocab(vocab_path) if vocab_path else None
+    if files:
+        train_loader, val_loader, _, data_info = prepare_streaming_data(
+            files, vocab=vocab, max_length=max_length, num_workers=0, shuffle_buffer=0
+        )
+    else:
+        df = create_sample_dataset()
+        train_loader, val_loader, _, data_info = prepare_data(df, max_length=max_length)
+        if vocab is not None:
+            for loader in (train_loader, val_loader):
+                loader.dataset.vocab = vocab
+            data_info['vocab_size'] = len(vocab)
+
+    torch.save({
+        'train': tokenize_dataset(train_loader.dataset),
+        'val': tokenize_dataset(val_loader.dataset),
+        'vocab_size': data_info['vocab_size'],
+        'num_classes': data_info['num_classes'],
+        'max_length': max_length,
+        'fingerprint': fingerprint
+    }, cache_path)
+    print(f"Tokenized data cached to {cache_path}")
+    return cache_path
+
+def run_trial_segment(trial_id: int,
+                      config: Dict,
+                      start_epoch: int,
+                      end_epoch: int,
+                      cache_path: str,
+                      checkpoint_dir: str,
+                      cpus_per_trial: int,
+                      batch_size: int,
+                      seed: int) -> Dict:
+    """Train one trial from start_epoch to end_epoch and validate it (runs in a worker process)"""
+    torch.set_num_threads(cpus_per_trial)
+    torch.manual_seed(seed + trial_id)
+    start_time = time.time()
+
+    cache = torch.load(cache_path)
+    train_loader = DataLoader(TensorDictDataset(cache['train']), batch_size=batch_size, shuffle=True)
+    val_loader = DataLoader(TensorDictDataset(cache['val']), batch_size=batch_size, shuffle=False)
+
+    checkpoint_path = os.path.join(checkpoint_dir, f'trial_{trial_id}.pth')
+    resume = start_epoch > 0
+    model = create_model({
+        'vocab_size': cache['vocab_size'],
+        'num_classes': cache['num_classes'],
+        'dropout_rate': config.get('dropout_rate', 0.3),
+        'fusion_method': config.get('fusion_method', 'concatenate'),
+        'max_length': cache['max_length'],
+        'pretrained': not resume
+    })
+    trainer = ModelTrainer(
+        model,
+        learning_rate=config.get('learning_rate', 2e-5),
+        glove_lr_multiplier=config.get('glove_lr_multiplier', 10.0),
+        classifier_lr_multiplier=config.get('classifier_lr_multiplier', 5.0)
+    )
+    if resume:
+        trainer.load_checkpoint(checkpoint_path)
+
+    for epoch in range(start_epoch, end_epoch):
+        train_loss, train_acc = trainer.train_epoch(train_loader)
+        trainer.train_history['train_loss'].append(train_loss)
+        trainer.train_history['train_acc'].append(train_acc)
+
+    val_loss, val_acc, val_metrics = trainer.validate(val_loader)
+    trainer.train_history['val_loss'].append(val_loss)
+    trainer.train_history['val_acc'].append(val_acc)
+    trainer.save_checkpoint(checkpoint_path, epoch=end_epoch - 1, val_acc=val_acc)
+
+    return {
+        'trial_id': trial_id,
+        'epochs': end_epoch,
+        'val_loss': val_loss,
+        'val_acc': val_acc,
+        'val_f1': val_metrics['f1'],
+        'seconds': time.time() - start_time
+    }
+
+class SweepStore:
+    """SQLite store for sweep trials and their per-rung results"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS trials (
+                sweep_id TEXT,
+                trial_id INTEGER,
+                config TEXT,
+                created_at TEXT,
+                PRIMARY KEY (sweep_id, trial_id)
+            );
+            CREATE TABLE IF NOT EXISTS results (
+                sweep_id TEXT,
+                trial_id INTEGER,
+                rung INTEGER,
+                epochs INTEGER,
+                val_loss REAL,
+                val_acc REAL,
+                val_f1 REAL,
+                seconds REAL,
+                status TEXT,
+                created_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_results_sweep ON results (sweep_id, rung, val_f1);
+        """)
+
+    def add_trial(self, sweep_id: str, trial_id: int, config: Dict):
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO trials VALUES (?, ?, ?, ?)",
+                (sweep_id, trial_id, json.dumps(config), datetime.now().isoformat())
+            )
+
+    def add_result(self, sweep_id: str, rung: int, result: Dict, status: str):
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (sweep_id, result['trial_id'], rung, result.get('epochs'), result.get('val_loss'),
+                 result.get('val_acc'), result.get('val_f1'), result.get('seconds'), status,
+                 datetime.now().isoformat())
+            )
+
+    def best_trials(self, sweep_id: str, limit: int = 5) -> List[Dict]:
+        """Return the best trials by validation F1 at their highest completed rung"""
+        rows = self.connection.execute("""
+            SELECT r.trial_id, MAX(r.rung), r.epochs, r.val_f1, r.val_acc, t.config
+            FROM results r JOIN trials t USING (sweep_id, trial_id)
+            WHERE r.sweep_id = ? AND r.status = 'completed'
+            GROUP BY r.trial_id
+            ORDER BY MAX(r.rung) DESC, r.val_f1 DESC
+            LIMIT ?
+        """, (sweep_id, limit)).fetchall()
+        return [
+            {'trial_id': row[0], 'rung': row[1], 'epochs': row[2], 'val_f1': row[3],
+             'val_acc': row[4], 'config': json.loads(row[5])}
+            for row in rows
+        ]
+
+class ASHAScheduler:
+    """Asynchronous successive halving: promote the top 1/eta of each rung as soon as possible"""
+
+    def __init__(self, num_trials: int, min_epochs: int = 1, max_epochs: int = 9, reduction_factor: int = 3):
+        self.num_trials = num_trials
+        self.reduction_factor = reduction_factor
+        self.rung_epochs = []
+        epochs = min_epochs
+        while epochs < max_epochs:
+            self.rung_epochs.append(epochs)
+            epochs *= reduction_factor
+        self.rung_epochs.append(max_epochs)
+
+        self.rung_results: List[Dict[int, float]] = [{} for _ in self.rung_epochs]
+        self.promoted: List[set] = [set() for _ in self.rung_epochs]
+        self.trials_started = 0
+
+    def next_job(self) -> Optional[Tuple[int, int]]:
+        """Return (trial_id, rung) to run next, or None if nothing is runnable yet"""
+        # Prefer promotions from the highest rung down
+        for rung in reversed(range(len(self.rung_epochs) - 1)):
+            results = self.rung_results[rung]
+            num_promotable = len(results) // self.reduction_factor
+            ranked = sorted(results, key=results.get, reverse=True)[:num_promotable]
+            for trial_id in ranked:
+                if trial_id not in self.promoted[rung]:
+                    self.promoted[rung].add(trial_id)
+                    return trial_id, rung + 1
+
+        if self.trials_started < self.num_trials:
+            trial_id = self.trials_started
+            self.trials_started += 1
+            return trial_id, 0
+        return None
+
+    def report(self, trial_id: int, rung: int, metric: float):
+        self.rung_results[rung][trial_id] = metric
+
+def run_sweep(search_space: Dict,
+              num_trials: int = 9,
+              cpu_budget: Optional[int] = None,
+              cpus_per_trial: int = 2,
+              min_epochs: int = 1,
+              max_epochs: int = 9,
+              reduction_factor: int = 3,
+              max_length: int = 128,
+              batch_size: int = 16,
+              output_dir: str = 'sweeps',
+              seed: int = 42,
+              data_paths: Optional[List[str]] = None,
+              vocab_path: Optional[str] = None) -> List[Dict]:
+    """Run an ASHA sweep over a local process pool"""
+    sweep_id = datetime.now().strftime('%Y%m%d-%H%M%S')
+    checkpoint_dir = os.path.join(output_dir, sweep_id)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+
+    cache_path = build_data_cache(os.path.join(output_dir, 'cache'), max_length, data_paths, vocab_path)
+    store = SweepStore(os.path.join(output_dir, 'sweep_results.db'))
+    scheduler = ASHAScheduler(num_trials, min_epochs, max_epochs, reduction_factor)
+    rng = random.Random(seed)
+
+    cpu_budget = cpu_budget or os.cpu_count() or 1
+    num_workers = max(1, cpu_budget // cpus_per_trial)
+    print(f"Sweep {sweep_id}: {num_trials} trials, rungs {scheduler.rung_epochs} epochs, "
+          f"{num_workers} parallel trials x {cpus_per_trial} CPUs")
+
+    configs = {}
+    running = {}
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=context) as executor:
+        while True:
+            # Keep every worker busy while there is runnable work
+            while len(running) < num_workers:
+                job = scheduler.next_job()
+                if job is None:
+                    break
+                trial_id, rung = job
+                if trial_id not in configs:
+                    configs[trial_id] = sample_config(search_space, rng)
+                    store.add_trial(sweep_id, trial_id, configs[trial_id])
+                start_epoch = scheduler.rung_epochs[rung - 1] if rung > 0 else 0
+                future = executor.submit(
+                    run_trial_segment, trial_id, configs[trial_id], start_epoch,
+                    scheduler.rung_epochs[rung], cache_path, checkpoint_dir,
+                    cpus_per_trial, batch_size, seed
+                )
+                running[future] = (trial_id, rung)
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                trial_id, rung = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"  Trial {trial_id} failed at rung {rung}: {e}")
+                    store.add_result(sweep_id, rung, {'trial_id': trial_id}, status='failed')
+                    continue
+                scheduler.report(trial_id, rung, result['val_f1'])
+                store.add_result(sweep_id, rung, result, status='completed')
+                print(f"  Trial {trial_id} rung {rung} ({result['epochs']} epochs): "
+                      f"val F1 {result['val_f1']:.4f}, {result['seconds']:.1f}s")
+
+    best = store.best_trials(sweep_id)
+    print(f"\nSweep {sweep_id} completed. Best trials:")
+    for trial in best:
+        print(f"  Trial {trial['trial_id']}: F1 {trial['val_f1']:.4f} after {trial['epochs']} epochs, "
+              f"config {trial['config']}")
+    return best
+
+def main():
+    """Main sweep function"""
+    parser = argparse.ArgumentParser(description='ASHA hyper-parameter sweep for RoBERTaNET')
+    parser.add_argument('--search-space', default=None, help='JSON file with the search space')
+    parser.add_argument('--num-trials', type=int, default=9)
+    parser.add_argument('--cpu-budget', type=int, default=None)
+    parser.add_argument('--cpus-per-trial', type=int, default=2)
+    parser.add_argument('--min-epochs', type=int, default=1)
+    parser.add_argument('--max-epochs', type=int, default=9)
+    parser.add_argument('--reduction-factor', type=int, default=3)
+    parser.add_argument('--max-length', type=int, default=128)
+    parser.add_argument('--output-dir', default='sweeps')
+    parser.add_argument('--data', nargs='+', default=None,
+                        help='Sharded JSONL/CSV/Parquet files or globs (default: ROBERTANET_DATA, '
+                             'comma-separated, as in train_model.py; else the sample dataset)')
+    parser.add_argument('--vocab', default=None,
+                        help='Vocabulary JSON to tokenize with (default: built from the data)')
+    args = parser.parse_args()
+    if args.data is None and os.environ.get('ROBERTANET_DATA'):
+        args.data = os.environ['ROBERTANET_DATA'].split(',')
+
+    search_space = DEFAULT_SEARCH_SPACE
+    if args.search_space:
+        with open(args.search_space, 'r') as f:
+            search_space = json.load(f)
+
+    print("RoBERTaNET Hyper-parameter Sweep")
+    print("=" * 50)
+    run_sweep(
+        search_space,
+        num_trials=args.num_trials,
+        cpu_budget=args.cpu_budget,
+        cpus_per_trial=args.cpus_per_trial,
+        min_epochs=args.min_epochs,
+        max_epochs=args.max_epochs,
+        reduction_factor=args.reduction_factor,
+        max_length=args.max_length,
+        output_dir=args.output_dir,
+        data_paths=args.data,
+        vocab_path=args.vocab
+    )
+
+if __name__ == "__main__":
+    main()
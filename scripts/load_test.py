@@ -0,0 +1,259 @@
+"""
+Open-loop load generator and SLO report for the RoBERTaNET inference endpoint
+Replays a text corpus as Poisson arrivals at fixed offered rates, sweeps client
+concurrency and reports throughput, tail latency, error rate and the saturation point
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+def load_corpus(path: Optional[str] = None, limit: Optional[int] = None, max_chars: int = 5000) -> List[str]:
+    """
+    Texts to replay. JSON-lines files may hold a 'text' field or 'title'/'body'
+    fields (the requests.jsonl format); without a path the sample dataset is used.
+    """
+    texts = []
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                text = record.get('text') or ' '.join(
+                    str(record[key]) for key in ('title', 'body') if record.get(key)
+                )
+                if text:
+                    texts.append(text[:max_chars])
+    else:
+        # Imported here so the client does not need the training stack when replaying a file
+        from data_preprocessing import create_sample_dataset
+        texts = [text[:max_chars] for text in create_sample_dataset()['text'].tolist()]
+
+    if not texts:
+        raise ValueError(f"No texts found in {path or 'sample dataset'}")
+    return texts[:limit] if limit else texts
+
+def poisson_schedule(rate: float, duration: float, rng: random.Random) -> List[float]:
+    """Arrival offsets in seconds with exponential inter-arrival gaps"""
+    offsets = []
+    t = rng.expovariate(rate)
+    while t < duration:
+        offsets.append(t)
+        t += rng.expovariate(rate)
+    return offsets
+
+def latency_summary(latencies: List[float]) -> Dict:
+    """p50/p99/p999 and mean of latencies in milliseconds"""
+    if not latencies:
+        return {'p50_ms': None, 'p99_ms': None, 'p999_ms': None, 'mean_ms': None}
+    values = np.asarray(latencies) * 1000
+    return {
+        'p50_ms': float(np.percentile(values, 50)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'p999_ms': float(np.percentile(values, 99.9)),
+        'mean_ms': float(values.mean())
+    }
+
+class LoadGenerator:
+    """Open-loop client: requests are sent on schedule whether or not earlier ones finished"""
+
+    def __init__(self, url: str, corpus: List[str], timeout: float = 10.0, seed: int = 42):
+        self.url = url
+        self.corpus = corpus
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+
+    def _request(self, text: str, scheduled: float) -> Dict:
+        """POST one text; latency is measured from the scheduled arrival, not the send time"""
+        sent = time.perf_counter()
+        payload = json.dumps({'text': text}).encode('utf-8')
+        request = urllib.request.Request(self.url, data=payload, headers={'Content-Type': 'application/json'})
+        error = None
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            error = f'http_{e.code}'
+        except (urllib.error.URLError, TimeoutError, OSError) as e:
+            reason = getattr(e, 'reason', e)
+            error = 'timeout' if isinstance(reason, TimeoutError) or 'timed out' in str(reason) else 'connection'
+        except ValueError:
+            error = 'bad_response'
+        except Exception as e:
+            # e.g. http.client.IncompleteRead or BadStatusLine; must not drop the request from the stats
+            error = type(e).__name__
+        finished = time.perf_counter()
+        return {
+            'latency': finished - scheduled,
+            'service_time': finished - sent,
+            'queue_delay': sent - scheduled,
+            'finished': finished,
+            'error': error
+        }
+
+    def run_level(self, rate: float, concurrency: int, duration: float) -> Dict:
+        """Offer `rate` requests/s for `duration` seconds through `concurrency` connections"""
+        schedule = poisson_schedule(rate, duration, self.rng)
+        texts = [self.rng.choice(self.corpus) for _ in schedule]
+        results = []
+        lock = threading.Lock()
+
+        def record(future):
+            with lock:
+                results.append(future.result())
+
+        # Requests beyond `concurrency` wait in the executor queue; that wait counts as latency
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        start = time.perf_counter()
+        max_dispatch_lag = 0.0
+        for offset, text in zip(schedule, texts):
+            scheduled = start + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                max_dispatch_lag = max(max_dispatch_lag, -delay)
+            executor.submit(self._request, text, scheduled).add_done_callback(record)
+        executor.shutdown(wait=True)
+
+        elapsed = max([r['finished'] for r in results], default=start + duration) - start
+        elapsed = max(elapsed, duration)
+        ok = [r for r in results if r['error'] is None]
+        errors = {}
+        for r in results:
+            if r['error'] is not None:
+                errors[r['error']] = errors.get(r['error'], 0) + 1
+
+        return {
+            'offered_rate': rate,
+            # Arrivals actually drawn for this level; differs from `rate` by Poisson noise
+            'scheduled_rate': len(schedule) / duration,
+            'concurrency': concurrency,
+            'duration_seconds': duration,
+            'requests': len(results),
+            'successes': len(ok),
+            'errors': errors,
+            'error_rate': (len(results) - len(ok)) / len(results) if results else 0.0,
+            'throughput': len(ok) / elapsed,
+            'latency': latency_summary([r['latency'] for r in ok]),
+            'service_time': latency_summary([r['service_time'] for r in ok]),
+            'mean_queue_delay_ms': float(np.mean([r['queue_delay'] for r in results]) * 1000) if results else None,
+            # Large values mean the generator itself fell behind and the offered rate is not trustworthy
+            'max_dispatch_lag_ms': max_dispatch_lag * 1000
+        }
+
+def meets_slo(level: Dict, p99_ms: float, max_error_rate: float, min_throughput_ratio: float) -> bool:
+    """Whether a level kept up with its scheduled arrivals within the latency and error budgets"""
+    p99 = level['latency']['p99_ms']
+    return (
+        p99 is not None
+        and p99 <= p99_ms
+        and level['error_rate'] <= max_error_rate
+        and level['throughput'] >= min_throughput_ratio * level['scheduled_rate']
+    )
+
+def find_saturation(levels: List[Dict], p99_ms: float, max_error_rate: float,
+                    min_throughput_ratio: float = 0.95) -> Dict:
+    """
+    Highest sustainable offered rate per concurrency (every rate up to it met the SLO)
+    and the first rate that broke it; the overall saturation point is the best of these.
+    """
+    per_concurrency = []
+    for concurrency in sorted({level['concurrency'] for level in levels}):
+        sustainable, saturated = None, None
+        for level in sorted((l for l in levels if l['concurrency'] == concurrency), key=lambda l: l['offered_rate']):
+            if meets_slo(level, p99_ms, max_error_rate, min_throughput_ratio):
+                sustainable = level
+            else:
+                saturated = level
+                break
+        per_concurrency.append({
+            'concurrency': concurrency,
+            'max_sustainable_rate': sustainable['offered_rate'] if sustainable else None,
+            'throughput_at_max': sustainable['throughput'] if sustainable else None,
+            'p99_ms_at_max': sustainable['latency']['p99_ms'] if sustainable else None,
+            'saturated_at_rate': saturated['offered_rate'] if saturated else None
+        })
+
+    candidates = [entry for entry in per_concurrency if entry['max_sustainable_rate'] is not None]
+    best = max(candidates, key=lambda e: (e['max_sustainable_rate'], -e['concurrency']), default=None)
+    return {'per_concurrency': per_concurrency, 'saturation_point': best}
+
+def main():
+    """Main load test function"""
+    parser = argparse.ArgumentParser(description='Open-loop Poisson load test for the RoBERTaNET endpoint')
+    parser.add_argument('--url', default='http://127.0.0.1:8000/analyze')
+    parser.add_argument('--corpus', default=None, help='JSON-lines file with text or title/body fields')
+    parser.add_argument('--limit', type=int, default=None, help='Use at most this many corpus texts')
+    parser.add_argument('--rates', type=float, nargs='+', default=[1, 2, 5, 10, 20, 50],
+                        help='Offered arrival rates (requests/s)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16],
+                        help='Client connection limits to sweep')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds per rate level')
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--slo-p99-ms', type=float, default=500.0)
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='load_test_results.json')
+    args = parser.parse_args()
+
+    print("RoBERTaNET Load Test")
+    print("=" * 50)
+
+    corpus = load_corpus(args.corpus, args.limit)
+    generator = LoadGenerator(args.url, corpus, timeout=args.timeout, seed=args.seed)
+    print(f"Endpoint: {args.url}, corpus: {len(corpus)} texts, {args.duration:.0f}s per level")
+
+    levels = []
+    for concurrency in args.concurrency:
+        print(f"\nConcurrency {concurrency}:")
+        for rate in sorted(args.rates):
+            level = generator.run_level(rate, concurrency, args.duration)
+            levels.append(level)
+            latency = level['latency']
+            p50 = f"{latency['p50_ms']:.1f}" if latency['p50_ms'] is not None else "-"
+            p99 = f"{latency['p99_ms']:.1f}" if latency['p99_ms'] is not None else "-"
+            p999 = f"{latency['p999_ms']:.1f}" if latency['p999_ms'] is not None else "-"
+            print(f"  {rate:7.1f} req/s offered -> {level['throughput']:7.1f} req/s, "
+                  f"p50 {p50} ms, p99 {p99} ms, p999 {p999} ms, errors {level['error_rate']:.1%}")
+            if level['error_rate'] > 0.5:
+                # Past saturation; higher rates at this concurrency only pile up timeouts
+                print("  Error rate above 50%, skipping higher rates")
+                break
+
+    saturation = find_saturation(levels, args.slo_p99_ms, args.max_error_rate)
+    report = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'endpoint': args.url,
+        'corpus': args.corpus or 'sample_dataset',
+        'corpus_size': len(corpus),
+        'slo': {'p99_ms': args.slo_p99_ms, 'max_error_rate': args.max_error_rate},
+        'levels': levels,
+        'saturation': saturation['per_concurrency'],
+        'saturation_point': saturation['saturation_point']
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    point = saturation['saturation_point']
+    print(f"\nSLO: p99 <= {args.slo_p99_ms:.0f} ms, error rate <= {args.max_error_rate:.1%}")
+    if point:
+        print(f"Saturation point: {point['max_sustainable_rate']:.1f} req/s at concurrency {point['concurrency']} "
+              f"(p99 {point['p99_ms_at_max']:.1f} ms)")
+    else:
+        print("No rate level met the SLO")
+    print(f"Load test results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
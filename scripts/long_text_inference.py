@@ -0,0 +1,235 @@
+"""
+Sliding-window long-text inference for RoBERTaNET
+Scores every overlapping token window of every document in a single padded batch
+"""
+
+import torch
+import torch.nn.functional as F
+from transformers import RobertaTokenizerFast
+from typing import Dict, List, Optional, Tuple
+
+from model_architecture import RoBERTaNET, create_model
+from data_preprocessing import TextPreprocessor
+from profiler import NULL_PROFILER, StageProfiler
+
+POOLING_METHODS = ('max', 'mean', 'attention')
+
+class LongTextScorer:
+    """Long-document scorer that splits texts into overlapping windows"""
+
+    def __init__(self,
+                 model: RoBERTaNET,
+                 tokenizer: RobertaTokenizerFast,
+                 vocab: Dict[str, int],
+                 device: str = 'cpu',
+                 window_size: int = 128,
+                 stride: int = 64,
+                 pooling: str = 'max',
+                 threshold: float = 0.5,
+                 max_batch_windows: Optional[int] = None,
+                 positive_class: int = 1,
+                 glove_length: Optional[int] = None,
+                 profiler: Optional[StageProfiler] = None):
+
+        if pooling not in POOLING_METHODS:
+            raise ValueError(f"Unknown pooling method: {pooling}")
+        if not tokenizer.is_fast:
+            raise ValueError("LongTextScorer needs a fast tokenizer for offset mapping")
+
+        # Room for <s> and </s> in every window
+        content_size = window_size - 2
+        if stride <= 0 or stride > content_size:
+            raise ValueError(f"stride must be in [1, {content_size}] for window_size {window_size}")
+
+        self.model = model.to(device)
+        self.model.eval()
+        self.tokenizer = tokenizer
+        self.vocab = vocab
+        self.device = device
+        self.window_size = window_size
+        self.content_size = content_size
+        self.stride = stride
+        self.pooling = pooling
+        self.threshold = threshold
+        self.max_batch_windows = max_batch_windows
+        self.positive_class = positive_class
+        # GloVe ids are padded to the training max_length recorded with the model,
+        # because the GloVe branch averages over <PAD> positions too
+        self.glove_length = glove_length or model.max_length
+        self.preprocessor = TextPreprocessor()
+        self.set_profiler(profiler)
+
+    def set_profiler(self, profiler: Optional[StageProfiler]):
+        """Record tokenization, copies and model stages (one step per score() call) on a profiler"""
+        self.profiler = profiler if profiler is not None else NULL_PROFILER
+        self.model.profiler = self.profiler
+
+    def _make_windows(self, text: str) -> Tuple[str, List[Dict]]:
+        """Clean a text and split its tokens into overlapping windows"""
+        cleaned, char_offsets = self.preprocessor.clean_text_with_offsets(text)
+        encoding = self.tokenizer(
+            cleaned,
+            add_special_tokens=False,
+            return_offsets_mapping=True
+        )
+        token_ids = encoding['input_ids']
+        token_offsets = encoding['offset_mapping']
+
+        # Window start positions; the last window always reaches the end of the text
+        last_start = max(len(token_ids) - self.content_size, 0)
+        starts = list(range(0, last_start + 1, self.stride))
+        if starts[-1] != last_start:
+            starts.append(last_start)
+
+        windows = []
+        for start in starts:
+            end = min(start + self.content_size, len(token_ids))
+            ids = [self.tokenizer.cls_token_id] + token_ids[start:end] + [self.tokenizer.sep_token_id]
+
+            if end > start:
+                clean_start = token_offsets[start][0]
+                clean_end = token_offsets[end - 1][1]
+                orig_start = char_offsets[clean_start][0]
+                orig_end = char_offsets[clean_end - 1][1]
+            else:
+                clean_start = clean_end = orig_start = orig_end = 0
+
+            # GloVe tokenization (word-level) over the same character span
+            words = cleaned[clean_start:clean_end].split()[:self.glove_length]
+            glove_ids = [self.vocab.get(word, self.vocab['<UNK>']) for word in words]
+
+            windows.append({
+                'input_ids': ids,
+                'glove_input_ids': glove_ids,
+                'start': orig_start,
+                'end': orig_end
+            })
+
+        return cleaned, windows
+
+    def _collate(self, windows: List[Dict]) -> Dict[str, torch.Tensor]:
+        """Pad RoBERTa ids to the longest window and GloVe ids to the fixed glove_length"""
+        pad_id = self.tokenizer.pad_token_id
+        seq_len = max(len(w['input_ids']) for w in windows)
+        glove_len = self.glove_length
+
+        input_ids = torch.full((len(windows), seq_len), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(windows), seq_len), dtype=torch.long)
+        glove_input_ids = torch.full((len(windows), glove_len), self.vocab['<PAD>'], dtype=torch.long)
+
+        for i, window in enumerate(windows):
+            input_ids[i, :len(window['input_ids'])] = torch.tensor(window['input_ids'])
+            attention_mask[i, :len(window['input_ids'])] = 1
+            if window['glove_input_ids']:
+                glove_input_ids[i, :len(window['glove_input_ids'])] = torch.tensor(window['glove_input_ids'])
+
+        return {
+            'input_ids': input_ids.to(self.device),
+            'attention_mask': attention_mask.to(self.device),
+            'glove_input_ids': glove_input_ids.to(self.device)
+        }
+
+    def _score_windows(self, windows: List[Dict]) -> torch.Tensor:
+        """Run all windows through the model and return per-window logits"""
+        chunk_size = self.max_batch_windows or len(windows)
+        all_logits = []
+
+        with torch.no_grad():
+            for start in range(0, len(windows), chunk_size):
+                with self.profiler.stage('host_to_device'):
+                    batch = self._collate(windows[start:start + chunk_size])
+                logits = self.model(batch['input_ids'], batch['attention_mask'], batch['glove_input_ids'])
+                all_logits.append(logits.float().cpu())
+
+        return torch.cat(all_logits, dim=0)
+
+    def _pool(self, logits: torch.Tensor) -> torch.Tensor:
+        """Aggregate window probabilities into one document distribution"""
+        probabilities = F.softmax(logits, dim=1)
+
+        if self.pooling == 'max':
+            # Document takes the distribution of its most abusive window
+            return probabilities[torch.argmax(probabilities[:, self.positive_class])]
+        if self.pooling == 'mean':
+            return probabilities.mean(dim=0)
+
+        # Attention pooling: windows weighted by their positive-class margin
+        margin = logits[:, self.positive_class] - torch.logsumexp(
+            torch.cat([logits[:, :self.positive_class], logits[:, self.positive_class + 1:]], dim=1), dim=1
+        )
+        weights = F.softmax(margin, dim=0)
+        return (weights.unsqueeze(1) * probabilities).sum(dim=0)
+
+    def _offending_spans(self, windows: List[Dict], scores: List[float]) -> List[Dict]:
+        """Merge overlapping windows above the threshold into character spans"""
+        spans = []
+        for window, score in sorted(zip(windows, scores), key=lambda item: item[0]['start']):
+            if score < self.threshold or window['end'] <= window['start']:
+                continue
+            if spans and window['start'] <= spans[-1]['end']:
+                spans[-1]['end'] = max(spans[-1]['end'], window['end'])
+                spans[-1]['score'] = max(spans[-1]['score'], score)
+            else:
+                spans.append({'start': window['start'], 'end': window['end'], 'score': score})
+        return spans
+
+    def score(self, texts: List[str]) -> List[Dict]:
+        """Score a batch of documents of any length"""
+        if not texts:
+            return []
+        all_windows = []
+        doc_ranges = []
+        with self.profiler.stage('tokenize'):
+            for text in texts:
+                _, windows = self._make_windows(text)
+                doc_ranges.append((len(all_windows), len(all_windows) + len(windows)))
+                all_windows.extend(windows)
+
+        logits = self._score_windows(all_windows)
+
+        results = []
+        for (start, end), text in zip(doc_ranges, texts):
+            doc_logits = logits[start:end]
+            doc_probs = self._pool(doc_logits)
+            window_scores = F.softmax(doc_logits, dim=1)[:, self.positive_class].tolist()
+
+            bullying_probability = float(doc_probs[self.positive_class])
+            prediction = int(torch.argmax(doc_probs))
+            results.append({
+                'prediction': prediction,
+                'confidence': float(doc_probs[prediction]),
+                'bullying_probability': bullying_probability,
+                'non_bullying_probability': 1.0 - bullying_probability,
+                'num_windows': end - start,
+                'pooling': self.pooling,
+                'spans': self._offending_spans(all_windows[start:end], window_scores)
+            })
+
+        self.profiler.step(num_samples=len(texts))
+        return results
+
+def create_long_text_scorer(model: RoBERTaNET,
+                            vocab: Dict[str, int],
+                            roberta_model: str = 'roberta-base',
+                            **kwargs) -> LongTextScorer:
+    """Factory function to build a LongTextScorer with a matching fast tokenizer"""
+    tokenizer = RobertaTokenizerFast.from_pretrained(roberta_model)
+    return LongTextScorer(model, tokenizer, vocab, **kwargs)
+
+if __name__ == "__main__":
+    # Test long-text scoring on an untrained model
+    from data_preprocessing import create_sample_dataset
+
+    df = create_sample_dataset()
+    preprocessor = TextPreprocessor()
+    vocab = preprocessor.create_vocabulary(df['text'].apply(preprocessor.clean_text).tolist())
+
+    model = create_model({'vocab_size': len(vocab), 'num_classes': 2})
+    scorer = create_long_text_scorer(model, vocab, window_size=64, stride=32, pooling='attention')
+
+    long_text = " ".join(["What a beautiful day for a walk."] * 40) + " You're so stupid and worthless"
+    for result in scorer.score([long_text, "Hope you have a wonderful day"]):
+        print(f"Windows: {result['num_windows']}, P(bullying): {result['bullying_probability']:.3f}, "
+              f"spans: {result['spans']}")
+
+    print("Long-text inference test completed successfully!")
@@ -3,23 +3,67 @@ RoBERTaNET: GloVe-Enhanced Cyberbullying Detection Model
 Combines GloVe embeddings with RoBERTa for improved contextual understanding
 """
 
+import math
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from transformers import RobertaModel, RobertaTokenizer
+from transformers import RobertaConfig, RobertaModel, RobertaTokenizer
 import numpy as np
 from typing import Dict, List, Tuple, Optional
 
+from profiler import NULL_PROFILER
+
+GLOVE_STORAGE_TYPES = ('fp32', 'fp16', 'int8', 'pq')
+
 class GloVeEmbedding(nn.Module):
-    """GloVe embedding layer for global semantic relationships"""
+    """
+    GloVe embedding layer for global semantic relationships.
     
-    def __init__(self, vocab_size: int, embedding_dim: int = 300):
+    The table is stored as a trainable fp32 nn.Embedding by default, or as a
+    frozen compressed buffer ('fp16', row-wise 'int8', or product-quantized
+    'pq') that is dequantized on lookup.
+    """
+    
+    def __init__(self,
+                 vocab_size: int,
+                 embedding_dim: int = 300,
+                 storage: str = 'fp32',
+                 pq_subvectors: int = 30,
+                 pq_centroids: int = 256):
         super(GloVeEmbedding, self).__init__()
+        if storage not in GLOVE_STORAGE_TYPES:
+            raise ValueError(f"Unknown GloVe storage: {storage}")
+        self.vocab_size = vocab_size
         self.embedding_dim = embedding_dim
-        self.embedding = nn.Embedding(vocab_size, embedding_dim)
+        self.storage = storage
+        self.pq_subvectors = pq_subvectors
+        self.pq_centroids = pq_centroids
+        
+        if storage == 'fp32':
+            self.embedding = nn.Embedding(vocab_size, embedding_dim)
+        else:
+            # Empty buffers of the right shape so compressed checkpoints load directly
+            self._register_compressed(storage, vocab_size)
         
-    def load_pretrained_glove(self, glove_path: str, word_to_idx: Dict[str, int]):
+    def _register_compressed(self, storage: str, vocab_size: int):
+        if storage == 'fp16':
+            self.register_buffer('weight_fp16', torch.zeros(vocab_size, self.embedding_dim, dtype=torch.float16))
+        elif storage == 'int8':
+            self.register_buffer('weight_int8', torch.zeros(vocab_size, self.embedding_dim, dtype=torch.int8))
+            self.register_buffer('row_scale', torch.ones(vocab_size))
+        elif storage == 'pq':
+            if self.embedding_dim % self.pq_subvectors != 0:
+                raise ValueError(f"embedding_dim {self.embedding_dim} not divisible by {self.pq_subvectors} subvectors")
+            if self.pq_centroids > 256:
+                raise ValueError("pq_centroids must fit in uint8 codes (<= 256)")
+            sub_dim = self.embedding_dim // self.pq_subvectors
+            self.register_buffer('pq_codes', torch.zeros(vocab_size, self.pq_subvectors, dtype=torch.uint8))
+            self.register_buffer('pq_codebooks', torch.zeros(self.pq_subvectors, self.pq_centroids, sub_dim))
+        
+    def load_pretrained_glove(self, glove_path: str, word_to_idx: Dict[str, int], freeze: bool = False):
         """Load pre-trained GloVe embeddings"""
+        if self.storage != 'fp32':
+            raise ValueError("Load GloVe vectors before compressing the table")
         print(f"Loading GloVe embeddings from {glove_path}")
         
         # Initialize embedding matrix
@@ -33,10 +77,116 @@ class GloVeEmbedding(nn.Module):
             embedding_matrix[idx] = torch.randn(self.embedding_dim) * 0.1
             
         self.embedding.weight.data.copy_(embedding_matrix)
+        if freeze:
+            self.freeze()
         print("GloVe embeddings loaded successfully")
         
+    def freeze(self):
+        """Stop training the table (compressed tables are always frozen)"""
+        if self.storage == 'fp32':
+            self.embedding.weight.requires_grad_(False)
+        
+    def dense_weight(self) -> torch.Tensor:
+        """Return the full table as fp32"""
+        return self.lookup(torch.arange(self.vocab_size, device=self._storage_device()))
+        
+    def _storage_device(self) -> torch.device:
+        return next(iter(self.state_dict().values())).device
+        
+    def prune_rows(self, keep_ids: List[int]):
+        """Keep only the given rows, renumbering them 0..len(keep_ids)-1 in order"""
+        index = torch.tensor(keep_ids, dtype=torch.long, device=self._storage_device())
+        if self.storage == 'fp32':
+            weight = self.embedding.weight.data.index_select(0, index)
+            requires_grad = self.embedding.weight.requires_grad
+            self.embedding = nn.Embedding.from_pretrained(weight, freeze=not requires_grad)
+        elif self.storage == 'fp16':
+            self.weight_fp16 = self.weight_fp16.index_select(0, index)
+        elif self.storage == 'int8':
+            self.weight_int8 = self.weight_int8.index_select(0, index)
+            self.row_scale = self.row_scale.index_select(0, index)
+        elif self.storage == 'pq':
+            self.pq_codes = self.pq_codes.index_select(0, index)
+        self.vocab_size = len(keep_ids)
+        
+    def compress(self, storage: str, kmeans_iterations: int = 20, kmeans_sample: int = 65536, seed: int = 42):
+        """Convert the fp32 table to compressed, frozen storage"""
+        if storage not in GLOVE_STORAGE_TYPES:
+            raise ValueError(f"Unknown GloVe storage: {storage}")
+        if self.storage != 'fp32':
+            raise ValueError(f"Table is already compressed as {self.storage}")
+        if storage == 'fp32':
+            return
+        
+        weight = self.embedding.weight.data.float()
+        del self.embedding
+        self.storage = storage
+        self._register_compressed(storage, self.vocab_size)
+        
+        with torch.no_grad():
+            if storage == 'fp16':
+                self.weight_fp16 = weight.half()
+            elif storage == 'int8':
+                # Symmetric per-row quantization
+                scale = weight.abs().amax(dim=1).clamp_min(1e-8) / 127.0
+                self.weight_int8 = torch.round(weight / scale.unsqueeze(1)).clamp(-127, 127).to(torch.int8)
+                self.row_scale = scale
+            elif storage == 'pq':
+                self.pq_codebooks, self.pq_codes = self._product_quantize(
+                    weight, kmeans_iterations, kmeans_sample, seed
+                )
+        
+    def _product_quantize(self, weight: torch.Tensor, iterations: int,
+                          sample_size: int, seed: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Train one k-means codebook per subvector and encode every row"""
+        generator = torch.Generator().manual_seed(seed)
+        num_rows = weight.shape[0]
+        num_centroids = min(self.pq_centroids, num_rows)
+        sub_dim = self.embedding_dim // self.pq_subvectors
+        subvectors = weight.view(num_rows, self.pq_subvectors, sub_dim)
+        
+        sample = torch.randperm(num_rows, generator=generator)[:sample_size]
+        codebooks = torch.zeros(self.pq_subvectors, self.pq_centroids, sub_dim)
+        codes = torch.zeros(num_rows, self.pq_subvectors, dtype=torch.uint8)
+        
+        for m in range(self.pq_subvectors):
+            data = subvectors[sample, m].cpu()
+            centroids = data[torch.randperm(len(data), generator=generator)[:num_centroids]].clone()
+            for _ in range(iterations):
+                assignment = torch.cdist(data, centroids).argmin(dim=1)
+                for k in range(num_centroids):
+                    members = data[assignment == k]
+                    if len(members):
+                        centroids[k] = members.mean(dim=0)
+            codebooks[m, :num_centroids] = centroids
+            
+            # Encode all rows in chunks to bound memory
+            for start in range(0, num_rows, sample_size):
+                chunk = subvectors[start:start + sample_size, m].cpu()
+                codes[start:start + sample_size, m] = torch.cdist(chunk, centroids).argmin(dim=1).to(torch.uint8)
+        
+        return codebooks.to(weight.device), codes.to(weight.device)
+        
+    def lookup(self, x: torch.Tensor) -> torch.Tensor:
+        """Look up (and dequantize) rows for a tensor of ids"""
+        if self.storage == 'fp32':
+            return self.embedding(x)
+        if self.storage == 'fp16':
+            return F.embedding(x, self.weight_fp16).float()
+        if self.storage == 'int8':
+            return self.weight_int8[x].float() * self.row_scale[x].unsqueeze(-1)
+        # Product quantization: gather each subvector's centroid and concatenate
+        codes = self.pq_codes[x].long()
+        subvector_idx = torch.arange(self.pq_subvectors, device=codes.device)
+        vectors = self.pq_codebooks[subvector_idx, codes]
+        return vectors.reshape(*x.shape, self.embedding_dim)
+        
+    def table_bytes(self) -> int:
+        """Memory held by the table in bytes"""
+        return sum(t.numel() * t.element_size() for t in self.state_dict().values())
+        
     def forward(self, x):
-        return self.embedding(x)
+        return self.lookup(x)
 
 class RoBERTaNET(nn.Module):
     """
@@ -50,19 +200,45 @@ class RoBERTaNET(nn.Module):
                  roberta_model: str = 'roberta-base',
                  num_classes: int = 2,
                  dropout_rate: float = 0.3,
-                 fusion_method: str = 'concatenate'):
+                 fusion_method: str = 'concatenate',
+                 pretrained: bool = True,
+                 attn_implementation: Optional[str] = 'sdpa',
+                 num_fusion_heads: int = 8,
+                 encoder_layers: Optional[List[int]] = None,
+                 pruned_heads: Optional[Dict[int, List[int]]] = None,
+                 glove_storage: str = 'fp32',
+                 glove_pq_subvectors: int = 30,
+                 glove_pq_centroids: int = 256,
+                 max_length: int = 512):
         
         super(RoBERTaNET, self).__init__()
         
         self.fusion_method = fusion_method
         self.num_classes = num_classes
+        self.dropout_rate = dropout_rate
+        self.roberta_model_name = roberta_model
+        self.num_fusion_heads = num_fusion_heads
+        # Training sequence length; the GloVe mean runs over <PAD> rows, so inference pads GloVe ids to it
+        self.max_length = max_length
         
         # GloVe embedding component
-        self.glove_embedding = GloVeEmbedding(vocab_size, glove_dim)
+        self.glove_embedding = GloVeEmbedding(
+            vocab_size, glove_dim,
+            storage=glove_storage,
+            pq_subvectors=glove_pq_subvectors,
+            pq_centroids=glove_pq_centroids
+        )
         
-        # RoBERTa component
-        self.roberta = RobertaModel.from_pretrained(roberta_model)
+        # RoBERTa component (skip the pretrained download when a checkpoint will overwrite it)
+        self.roberta = self._load_roberta(roberta_model, pretrained, attn_implementation)
         self.roberta_dim = self.roberta.config.hidden_size
+        self.attn_implementation = getattr(self.roberta.config, '_attn_implementation', None) or 'eager'
+        
+        # Structured pruning of the encoder (see prune_model.py)
+        self.encoder_layers = list(range(self.roberta.config.num_hidden_layers))
+        self.pruned_heads: Dict[int, List[int]] = {}
+        if encoder_layers is not None or pruned_heads:
+            self.prune_encoder(encoder_layers, pruned_heads)
         
         # Fusion layers
         if fusion_method == 'concatenate':
@@ -75,6 +251,16 @@ class RoBERTaNET(nn.Module):
                 dropout=dropout_rate
             )
             self.glove_projection = nn.Linear(glove_dim, self.roberta_dim)
+        elif fusion_method == 'token_attention':
+            # CLS vector cross-attends over per-token GloVe vectors
+            fusion_dim = self.roberta_dim
+            if self.roberta_dim % num_fusion_heads != 0:
+                raise ValueError(f"roberta_dim {self.roberta_dim} not divisible by {num_fusion_heads} heads")
+            self.fusion_dropout = dropout_rate
+            self.query_projection = nn.Linear(self.roberta_dim, self.roberta_dim)
+            self.key_projection = nn.Linear(glove_dim, self.roberta_dim)
+            self.value_projection = nn.Linear(glove_dim, self.roberta_dim)
+            self.output_projection = nn.Linear(self.roberta_dim, self.roberta_dim)
         else:
             raise ValueError(f"Unknown fusion method: {fusion_method}")
         
@@ -93,47 +279,143 @@ class RoBERTaNET(nn.Module):
         # Layer normalization
         self.layer_norm = nn.LayerNorm(fusion_dim)
         
+        # Stage profiler (see profiler.StageProfiler); no-op by default
+        self.profiler = NULL_PROFILER
+        
+    @staticmethod
+    def _load_roberta(roberta_model: str, pretrained: bool, attn_implementation: Optional[str]) -> RobertaModel:
+        """Load the encoder, using the fused SDPA attention kernels when transformers supports them"""
+        kwargs = {'attn_implementation': attn_implementation} if attn_implementation else {}
+        try:
+            if pretrained:
+                return RobertaModel.from_pretrained(roberta_model, **kwargs)
+            return RobertaModel(RobertaConfig.from_pretrained(roberta_model, **kwargs))
+        except (TypeError, ValueError, ImportError) as e:
+            if not kwargs:
+                raise
+            print(f"attn_implementation={attn_implementation} unavailable ({e}); using eager attention")
+            return RoBERTaNET._load_roberta(roberta_model, pretrained, None)
+        
+    def prune_encoder(self,
+                      keep_layers: Optional[List[int]] = None,
+                      heads_to_prune: Optional[Dict[int, List[int]]] = None):
+        """
+        Physically remove encoder layers and attention heads.
+        
+        keep_layers are original layer indices to keep; heads_to_prune maps a
+        position in the kept layer list to original head indices to remove.
+        """
+        if keep_layers is not None:
+            keep_layers = sorted(int(idx) for idx in keep_layers)
+            if not keep_layers:
+                raise ValueError("At least one encoder layer must be kept")
+            positions = [self.encoder_layers.index(idx) for idx in keep_layers]
+            self.roberta.encoder.layer = nn.ModuleList([self.roberta.encoder.layer[pos] for pos in positions])
+            self.roberta.config.num_hidden_layers = len(keep_layers)
+            self.pruned_heads = {new_pos: self.pruned_heads[old_pos]
+                                 for new_pos, old_pos in enumerate(positions) if old_pos in self.pruned_heads}
+            self.encoder_layers = keep_layers
+        
+        if heads_to_prune:
+            heads_to_prune = {int(pos): sorted(int(h) for h in heads) for pos, heads in heads_to_prune.items()}
+            self.roberta.prune_heads(heads_to_prune)
+            for pos, heads in heads_to_prune.items():
+                self.pruned_heads[pos] = sorted(set(self.pruned_heads.get(pos, [])) | set(heads))
+        
+        # Keep the HF config's bookkeeping in step with the new layer positions
+        self.roberta.config.pruned_heads = {pos: list(heads) for pos, heads in self.pruned_heads.items()}
+        
+    def _token_attention(self,
+                         roberta_features: torch.Tensor,
+                         glove_tokens: torch.Tensor,
+                         glove_mask: torch.Tensor) -> torch.Tensor:
+        """Multi-head cross-attention from the CLS vector to the GloVe tokens"""
+        batch_size, num_tokens, _ = glove_tokens.shape
+        head_dim = self.roberta_dim // self.num_fusion_heads
+        
+        query = self.query_projection(roberta_features).view(batch_size, 1, self.num_fusion_heads, head_dim).transpose(1, 2)
+        key = self.key_projection(glove_tokens).view(batch_size, num_tokens, self.num_fusion_heads, head_dim).transpose(1, 2)
+        value = self.value_projection(glove_tokens).view(batch_size, num_tokens, self.num_fusion_heads, head_dim).transpose(1, 2)
+        
+        # Boolean mask, True where a GloVe token may be attended to
+        attn_mask = glove_mask[:, None, None, :]
+        dropout_p = self.fusion_dropout if self.training else 0.0
+        
+        if hasattr(F, 'scaled_dot_product_attention'):
+            attended = F.scaled_dot_product_attention(query, key, value, attn_mask=attn_mask, dropout_p=dropout_p)
+        else:
+            # torch<2.0 fallback
+            scores = torch.matmul(query, key.transpose(-2, -1)) / math.sqrt(head_dim)
+            scores = scores.masked_fill(~attn_mask, float('-inf'))
+            weights = F.dropout(torch.softmax(scores, dim=-1), p=dropout_p, training=self.training)
+            attended = torch.matmul(weights, value)
+        
+        attended = attended.transpose(1, 2).reshape(batch_size, self.roberta_dim)
+        return roberta_features + self.output_projection(attended)
+        
     def forward(self, 
-                input_ids: torch.Tensor,
+                input_ids: Optional[torch.Tensor],
                 attention_mask: torch.Tensor,
-                glove_input_ids: Optional[torch.Tensor] = None) -> torch.Tensor:
+                glove_input_ids: Optional[torch.Tensor] = None,
+                inputs_embeds: Optional[torch.Tensor] = None,
+                glove_embeds: Optional[torch.Tensor] = None) -> torch.Tensor:
+        """
+        Classify a batch. inputs_embeds / glove_embeds replace the RoBERTa word
+        embeddings and GloVe lookups (used for gradient attributions);
+        glove_input_ids is still needed for the padding mask.
+        """
         
         # RoBERTa forward pass
-        roberta_outputs = self.roberta(
-            input_ids=input_ids,
-            attention_mask=attention_mask
-        )
-        roberta_features = roberta_outputs.last_hidden_state[:, 0, :]  # [CLS] token
+        with self.profiler.stage('roberta_encoder'):
+            if inputs_embeds is not None:
+                roberta_outputs = self.roberta(
+                    inputs_embeds=inputs_embeds,
+                    attention_mask=attention_mask
+                )
+            else:
+                roberta_outputs = self.roberta(
+                    input_ids=input_ids,
+                    attention_mask=attention_mask
+                )
+            roberta_features = roberta_outputs.last_hidden_state[:, 0, :]  # [CLS] token
         
         # GloVe forward pass
-        if glove_input_ids is not None:
-            glove_features = self.glove_embedding(glove_input_ids)
-            # Average pooling for GloVe features
-            glove_features = torch.mean(glove_features, dim=1)
-        else:
-            # Use same input_ids for GloVe (simplified for prototype)
-            glove_features = self.glove_embedding(input_ids)
-            glove_features = torch.mean(glove_features, dim=1)
+        with self.profiler.stage('glove_branch'):
+            if glove_input_ids is None:
+                # Use same input_ids for GloVe (simplified for prototype)
+                glove_input_ids = input_ids
+            glove_tokens = glove_embeds if glove_embeds is not None else self.glove_embedding(glove_input_ids)
+            if self.fusion_method == 'token_attention':
+                # <PAD> is index 0; keep at least one key so empty texts stay finite
+                glove_mask = glove_input_ids != 0
+                glove_mask[:, 0] |= ~glove_mask.any(dim=1)
+            else:
+                # Average pooling for GloVe features
+                glove_features = torch.mean(glove_tokens, dim=1)
         
         # Feature fusion
-        if self.fusion_method == 'concatenate':
-            fused_features = torch.cat([roberta_features, glove_features], dim=1)
-        elif self.fusion_method == 'attention':
-            # Project GloVe features to RoBERTa dimension
-            glove_projected = self.glove_projection(glove_features).unsqueeze(1)
-            roberta_expanded = roberta_features.unsqueeze(1)
+        with self.profiler.stage('fusion'):
+            if self.fusion_method == 'concatenate':
+                fused_features = torch.cat([roberta_features, glove_features], dim=1)
+            elif self.fusion_method == 'attention':
+                # Project GloVe features to RoBERTa dimension
+                glove_projected = self.glove_projection(glove_features).unsqueeze(1)
+                roberta_expanded = roberta_features.unsqueeze(1)
+                
+                # Apply attention mechanism
+                attended_features, _ = self.attention_layer(
+                    roberta_expanded, glove_projected, glove_projected
+                )
+                fused_features = attended_features.squeeze(1)
+            elif self.fusion_method == 'token_attention':
+                fused_features = self._token_attention(roberta_features, glove_tokens, glove_mask)
             
-            # Apply attention mechanism
-            attended_features, _ = self.attention_layer(
-                roberta_expanded, glove_projected, glove_projected
-            )
-            fused_features = attended_features.squeeze(1)
-        
-        # Layer normalization
-        fused_features = self.layer_norm(fused_features)
+            # Layer normalization
+            fused_features = self.layer_norm(fused_features)
         
         # Classification
-        logits = self.classifier(fused_features)
+        with self.profiler.stage('classifier'):
+            logits = self.classifier(fused_features)
         
         return logits
     
@@ -144,12 +426,23 @@ class RoBERTaNET(nn.Module):
         
         return {
             'model_name': 'RoBERTaNET',
+            'roberta_model': self.roberta_model_name,
+            'vocab_size': self.glove_embedding.vocab_size,
             'fusion_method': self.fusion_method,
+            'attn_implementation': self.attn_implementation,
+            'num_fusion_heads': self.num_fusion_heads,
             'num_classes': self.num_classes,
+            'dropout_rate': self.dropout_rate,
             'total_parameters': total_params,
             'trainable_parameters': trainable_params,
             'roberta_dim': self.roberta_dim,
-            'glove_dim': self.glove_embedding.embedding_dim
+            'glove_dim': self.glove_embedding.embedding_dim,
+            'glove_storage': self.glove_embedding.storage,
+            'glove_pq_subvectors': self.glove_embedding.pq_subvectors,
+            'glove_pq_centroids': self.glove_embedding.pq_centroids,
+            'encoder_layers': self.encoder_layers,
+            'pruned_heads': {str(pos): heads for pos, heads in self.pruned_heads.items()},
+            'max_length': self.max_length
         }
 
 def create_model(config: Dict) -> RoBERTaNET:
@@ -160,7 +453,16 @@ def create_model(config: Dict) -> RoBERTaNET:
         roberta_model=config.get('roberta_model', 'roberta-base'),
         num_classes=config.get('num_classes', 2),
         dropout_rate=config.get('dropout_rate', 0.3),
-        fusion_method=config.get('fusion_method', 'concatenate')
+        fusion_method=config.get('fusion_method', 'concatenate'),
+        pretrained=config.get('pretrained', True),
+        attn_implementation=config.get('attn_implementation', 'sdpa'),
+        num_fusion_heads=config.get('num_fusion_heads', 8),
+        encoder_layers=config.get('encoder_layers'),
+        pruned_heads=config.get('pruned_heads'),
+        glove_storage=config.get('glove_storage', 'fp32'),
+        glove_pq_subvectors=config.get('glove_pq_subvectors', 30),
+        glove_pq_centroids=config.get('glove_pq_centroids', 256),
+        max_length=config.get('max_length', 512)
     )
     
     print("RoBERTaNET model created successfully")
@@ -168,6 +470,40 @@ def create_model(config: Dict) -> RoBERTaNET:
     
     return model
 
+def load_model_from_checkpoint(checkpoint_path: str,
+                               device: str = 'cpu',
+                               mmap: bool = False,
+                               weights_only: bool = False) -> Tuple[RoBERTaNET, Dict]:
+    """
+    Rebuild a RoBERTaNET model from a checkpoint saved by ModelTrainer.
+    
+    With mmap=True (torch>=2.1) the weights stay backed by the checkpoint file
+    instead of being copied into process memory. weights_only=True refuses to
+    unpickle anything but tensors and plain containers.
+    """
+    if mmap:
+        checkpoint = torch.load(checkpoint_path, map_location='cpu', mmap=True, weights_only=weights_only)
+    else:
+        checkpoint = torch.load(checkpoint_path, map_location='cpu', weights_only=weights_only)
+    state_dict = checkpoint['model_state_dict']
+    
+    config = dict(checkpoint.get('model_config', {}))
+    if 'vocab_size' not in config:
+        # Older checkpoints only record the GloVe table in the state dict
+        config['vocab_size'] = state_dict['glove_embedding.embedding.weight'].shape[0]
+    config['pretrained'] = False
+    
+    model = create_model(config)
+    if mmap:
+        # Point parameters at the mapped tensors rather than copying them
+        model.load_state_dict(state_dict, assign=True)
+    else:
+        model.load_state_dict(state_dict)
+    model.to(device)
+    model.eval()
+    
+    return model, checkpoint
+
 if __name__ == "__main__":
     # Test model creation
     config = {
@@ -11,20 +11,24 @@ from sklearn.metrics import (
     confusion_matrix, classification_report, roc_auc_score, roc_curve
 )
 import json
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import pandas as pd
 
 # Import our modules
 from model_architecture import RoBERTaNET, create_model
 from data_preprocessing import create_sample_dataset, prepare_data
+from profiler import NULL_PROFILER, StageProfiler
 
 class ModelEvaluator:
     """Comprehensive model evaluation and analysis"""
     
-    def __init__(self, model: RoBERTaNET, device: str = 'cpu'):
+    def __init__(self, model: RoBERTaNET, device: str = 'cpu',
+                 profiler: Optional[StageProfiler] = None):
         self.model = model.to(device)
         self.device = device
         self.model.eval()
+        self.profiler = profiler if profiler is not None else NULL_PROFILER
+        self.model.profiler = self.profiler
         
     def predict(self, data_loader) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         """Get predictions and probabilities"""
@@ -33,13 +37,15 @@ class ModelEvaluator:
         all_probabilities = []
         
         with torch.no_grad():
-            for batch in data_loader:
-                input_ids = batch['input_ids'].to(self.device)
-                attention_mask = batch['attention_mask'].to(self.device)
-                glove_input_ids = batch['glove_input_ids'].to(self.device)
-                labels = batch['labels'].to(self.device)
+            for batch in self.profiler.iter_loader(data_loader):
+                with self.profiler.stage('host_to_device'):
+                    input_ids = batch['input_ids'].to(self.device)
+                    attention_mask = batch['attention_mask'].to(self.device)
+                    glove_input_ids = batch['glove_input_ids'].to(self.device)
+                    labels = batch['labels'].to(self.device)
                 
                 logits = self.model(input_ids, attention_mask, glove_input_ids)
+                self.profiler.step(num_samples=labels.size(0))
                 probabilities = torch.softmax(logits, dim=1)
                 predictions = torch.argmax(logits, dim=1)
                 
@@ -128,8 +134,9 @@ class ModelEvaluator:
         plt.show()
     
     def analyze_predictions(self, texts: List[str], y_true: np.ndarray, 
-                          y_pred: np.ndarray, y_prob: np.ndarray) -> pd.DataFrame:
-        """Analyze individual predictions"""
+                          y_pred: np.ndarray, y_prob: np.ndarray,
+                          explanations: Optional[Dict[int, Dict]] = None) -> pd.DataFrame:
+        """Analyze individual predictions, optionally with token attributions per index"""
         
         results = []
         for i, text in enumerate(texts):
@@ -157,6 +164,15 @@ class ModelEvaluator:
             print(f"  Text: '{row['text'][:50]}...'")
             print(f"  True: {row['true_label']}, Pred: {row['predicted_label']}, Conf: {row['confidence']:.3f}\n")
         
+        if explanations:
+            # Imported here to keep the evaluation suite free of the explanation engine's setup
+            from explain_predictions import top_tokens
+            print("Flagged Predictions (Top Attributed Tokens):")
+            for idx, explanation in list(explanations.items())[:3]:
+                tokens = ', '.join(f"{t['token']} ({t['attribution']:+.3f})" for t in top_tokens(explanation))
+                print(f"  Text: '{texts[idx][:50]}...'")
+                print(f"  Tokens: {tokens}\n")
+        
         return df
     
     def generate_report(self, metrics: Dict, save_path: str = 'evaluation_report.json'):
@@ -0,0 +1,295 @@
+"""
+Incremental online fine-tuning of RoBERTaNET from moderator feedback
+Mixes newly labelled items with a reservoir-sampled replay buffer, runs a bounded
+number of ModelTrainer steps from the latest checkpoint and hot-swaps the result into serving
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import time
+import urllib.request
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import torch
+from torch.utils.data import DataLoader
+from transformers import RobertaTokenizer
+
+from model_architecture import load_model_from_checkpoint
+from data_preprocessing import TextPreprocessor, create_sample_dataset, encode_example, load_vocab
+from train_model import ModelTrainer
+
+class FeedbackQueue:
+    """Append-only local queue of moderator-labelled items"""
+
+    def __init__(self, queue_dir: str = 'feedback'):
+        self.queue_dir = queue_dir
+        self.pending_path = os.path.join(queue_dir, 'pending.jsonl')
+        self.done_dir = os.path.join(queue_dir, 'done')
+        os.makedirs(self.done_dir, exist_ok=True)
+
+    def enqueue(self, text: str, label: int, item_id: Optional[str] = None):
+        """Add one labelled item"""
+        record = {
+            'id': item_id,
+            'text': text,
+            'label': int(label),
+            'created_at': datetime.now().isoformat()
+        }
+        with open(self.pending_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
+
+    def claim(self) -> Tuple[Optional[str], List[Dict]]:
+        """Atomically take every pending item; unacknowledged claims are retried on the next call"""
+        claimed = sorted(
+            os.path.join(self.queue_dir, name) for name in os.listdir(self.queue_dir)
+            if name.startswith('claimed-')
+        )
+        if not claimed:
+            if not os.path.exists(self.pending_path):
+                return None, []
+            claim_path = os.path.join(self.queue_dir, f"claimed-{time.time_ns()}.jsonl")
+            os.replace(self.pending_path, claim_path)
+            claimed = [claim_path]
+
+        claim_path = claimed[0]
+        with open(claim_path, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        return claim_path, records
+
+    def defer(self, claim_path: str, applied: List[Dict], deferred: List[Dict]):
+        """
+        Split a claim: deferred records go to a new claim that is retried on the next call,
+        and the original claim keeps only the applied ones. The new claim is written first,
+        so a crash in between can repeat items but never lose them.
+        """
+        deferred_path = os.path.join(self.queue_dir, f"claimed-{time.time_ns()}.jsonl")
+        for path, records in ((deferred_path, deferred), (claim_path, applied)):
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+            os.replace(tmp_path, path)
+
+    def acknowledge(self, claim_path: str):
+        """Mark a claim as applied to the model"""
+        os.replace(claim_path, os.path.join(self.done_dir, os.path.basename(claim_path)))
+
+class ReplayBuffer:
+    """Fixed-size uniform sample of all past training items (reservoir sampling)"""
+
+    def __init__(self, capacity: int = 5000, path: Optional[str] = None, seed: int = 42):
+        self.capacity = capacity
+        self.path = path
+        self.rng = random.Random(seed)
+        self.items: List[Dict] = []
+        self.num_seen = 0
+
+        if path is not None and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self.items = state['items']
+            self.num_seen = state['num_seen']
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, item: Dict):
+        """Algorithm R: every item seen so far is kept with probability capacity / num_seen"""
+        self.num_seen += 1
+        if len(self.items) < self.capacity:
+            self.items.append(item)
+        else:
+            idx = self.rng.randrange(self.num_seen)
+            if idx < self.capacity:
+                self.items[idx] = item
+
+    def sample(self, k: int) -> List[Dict]:
+        if not self.items:
+            return []
+        if k <= len(self.items):
+            return self.rng.sample(self.items, k)
+        return [self.rng.choice(self.items) for _ in range(k)]
+
+    def save(self):
+        """Persist the buffer atomically"""
+        if self.path is None:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'num_seen': self.num_seen, 'items': self.items}, f)
+        os.replace(tmp_path, self.path)
+
+class OnlineUpdater:
+    """Applies queued feedback to the latest checkpoint with a bounded number of steps"""
+
+    def __init__(self,
+                 checkpoint_path: str,
+                 vocab: Dict[str, int],
+                 queue: FeedbackQueue,
+                 replay_buffer: ReplayBuffer,
+                 device: str = 'cpu',
+                 max_steps: int = 20,
+                 batch_size: int = 16,
+                 new_fraction: float = 0.5,
+                 learning_rate: float = 1e-5,
+                 max_length: Optional[int] = None,
+                 serve_url: Optional[str] = None):
+
+        self.checkpoint_path = checkpoint_path
+        self.vocab = vocab
+        self.queue = queue
+        self.replay_buffer = replay_buffer
+        self.device = device
+        self.max_steps = max_steps
+        self.batch_size = batch_size
+        self.new_fraction = new_fraction
+        self.learning_rate = learning_rate
+        self.max_length = max_length
+        self.serve_url = serve_url
+        self.preprocessor = TextPreprocessor()
+        self.tokenizer = RobertaTokenizer.from_pretrained('roberta-base')
+
+    def _num_new_per_batch(self) -> int:
+        return max(1, math.ceil(self.batch_size * self.new_fraction))
+
+    def _build_loader(self, new_items: List[Dict], max_length: int) -> DataLoader:
+        """Mix new items with replayed ones, batch by batch"""
+        num_new = self._num_new_per_batch()
+        num_replay = self.batch_size - num_new if len(self.replay_buffer) else 0
+        num_steps = min(self.max_steps, max(1, math.ceil(len(new_items) / num_new)))
+
+        rng = self.replay_buffer.rng
+        examples = []
+        for step in range(num_steps):
+            batch = [new_items[(step * num_new + i) % len(new_items)] for i in range(num_new)]
+            batch += self.replay_buffer.sample(num_replay)
+            rng.shuffle(batch)
+            examples.extend(
+                encode_example(self.preprocessor.clean_text(item['text']), item['label'],
+                               self.tokenizer, self.vocab, max_length)
+                for item in batch
+            )
+
+        return DataLoader(examples, batch_size=num_new + num_replay, shuffle=False)
+
+    def _notify_server(self):
+        request = urllib.request.Request(
+            f"{self.serve_url.rstrip('/')}/admin/reload",
+            data=json.dumps({'checkpoint': os.path.abspath(self.checkpoint_path)}).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=300) as response:
+            print(f"Serving reload: {response.read().decode('utf-8')}")
+
+    def run_once(self) -> Optional[Dict]:
+        """Apply one claim of feedback; returns None when the queue is empty"""
+        claim_path, new_items = self.queue.claim()
+        if not new_items:
+            if claim_path is not None:
+                self.queue.acknowledge(claim_path)
+            return None
+
+        start_time = time.time()
+
+        # At most max_steps batches per update; the rest stay queued for the next one
+        capacity = self.max_steps * self._num_new_per_batch()
+        deferred = new_items[capacity:]
+        if deferred:
+            new_items = new_items[:capacity]
+            self.queue.defer(claim_path, new_items, deferred)
+            print(f"Deferring {len(deferred)} feedback items to the next update (max {capacity} per update)")
+        print(f"Applying {len(new_items)} feedback items from {claim_path}")
+
+        model, checkpoint = load_model_from_checkpoint(self.checkpoint_path, device=self.device)
+        trainer = ModelTrainer(model, device=self.device, learning_rate=self.learning_rate)
+        if 'train_history' in checkpoint:
+            trainer.train_history = checkpoint['train_history']
+
+        train_loss, train_acc = trainer.train_epoch(self._build_loader(new_items, self.max_length or model.max_length))
+
+        # Write next to the live checkpoint, then rename over it atomically
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        trainer.save_checkpoint(
+            tmp_path,
+            epoch=checkpoint.get('epoch'),
+            val_acc=checkpoint.get('val_acc'),
+            online_updates=checkpoint.get('online_updates', 0) + 1,
+            updated_at=datetime.now().isoformat()
+        )
+        os.replace(tmp_path, self.checkpoint_path)
+
+        for item in new_items:
+            self.replay_buffer.add({'text': item['text'], 'label': item['label']})
+        self.replay_buffer.save()
+        self.queue.acknowledge(claim_path)
+
+        if self.serve_url:
+            self._notify_server()
+
+        summary = {
+            'items': len(new_items),
+            'deferred': len(deferred),
+            'train_loss': train_loss,
+            'train_acc': train_acc,
+            'seconds': time.time() - start_time
+        }
+        print(f"Online update done: loss {train_loss:.4f}, acc {train_acc:.4f}, {summary['seconds']:.1f}s")
+        return summary
+
+def main():
+    """Main online fine-tuning loop"""
+    parser = argparse.ArgumentParser(description='Online RoBERTaNET fine-tuning from moderator feedback')
+    parser.add_argument('--checkpoint', default='robertanet_best_model.pth')
+    parser.add_argument('--vocab', default='robertanet_vocab.json')
+    parser.add_argument('--queue-dir', default='feedback')
+    parser.add_argument('--replay-path', default='feedback/replay_buffer.json')
+    parser.add_argument('--replay-capacity', type=int, default=5000)
+    parser.add_argument('--max-steps', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--new-fraction', type=float, default=0.5)
+    parser.add_argument('--learning-rate', type=float, default=1e-5)
+    parser.add_argument('--serve-url', default=None, help='Serving base URL to hot-swap weights into')
+    parser.add_argument('--poll-interval', type=float, default=30.0)
+    parser.add_argument('--once', action='store_true', help='Process the queue once and exit')
+    args = parser.parse_args()
+
+    print("RoBERTaNET Online Fine-tuning")
+    print("=" * 50)
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    queue = FeedbackQueue(args.queue_dir)
+    replay_buffer = ReplayBuffer(args.replay_capacity, args.replay_path)
+    if len(replay_buffer) == 0:
+        # Seed the buffer with the original training data
+        df = create_sample_dataset()
+        for text, label in zip(df['text'], df['label']):
+            replay_buffer.add({'text': text, 'label': int(label)})
+        replay_buffer.save()
+
+    updater = OnlineUpdater(
+        args.checkpoint,
+        load_vocab(args.vocab),
+        queue,
+        replay_buffer,
+        device=device,
+        max_steps=args.max_steps,
+        batch_size=args.batch_size,
+        new_fraction=args.new_fraction,
+        learning_rate=args.learning_rate,
+        serve_url=args.serve_url
+    )
+
+    while True:
+        result = updater.run_once()
+        if args.once:
+            break
+        if result is None:
+            time.sleep(args.poll_interval)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Lightweight hot-path instrumentation for RoBERTaNET training and inference
+Records per-stage timings, throughput and peak memory with optional torch.profiler traces
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import torch
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Canonical stage names, in pipeline order
+STAGES = [
+    'data_loader_wait',
+    'tokenize',
+    'host_to_device',
+    'roberta_encoder',
+    'glove_branch',
+    'fusion',
+    'classifier',
+    'backward',
+    'optimizer_step',
+]
+
+class _NullContext:
+    """Reusable no-op context manager"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_CONTEXT = _NullContext()
+
+class NullProfiler:
+    """Profiler with the same interface as StageProfiler that records nothing"""
+
+    enabled = False
+
+    def stage(self, name: str):
+        return _NULL_CONTEXT
+
+    def iter_loader(self, loader: Iterable) -> Iterable:
+        return loader
+
+    def step(self, num_samples: int = 0):
+        pass
+
+    def paused(self):
+        return _NULL_CONTEXT
+
+NULL_PROFILER = NullProfiler()
+
+class StageProfiler:
+    """
+    Accumulates wall-clock timings per pipeline stage.
+
+    Only a perf_counter pair and a dict update are paid per stage, so the
+    profiler can stay enabled in production. CUDA work is asynchronous;
+    set synchronize=True to attribute GPU time to the stage that issued it.
+    """
+
+    enabled = True
+
+    def __init__(self,
+                 synchronize: bool = False,
+                 trace_steps: Optional[Tuple[int, int]] = None,
+                 trace_dir: str = 'profiler_traces'):
+
+        self.synchronize = synchronize and torch.cuda.is_available()
+        self.trace_steps = trace_steps
+        self.trace_dir = trace_dir
+        self._lock = threading.Lock()
+        self._torch_profiler = None
+        self.reset()
+
+    def reset(self):
+        """Clear all accumulated statistics"""
+        with self._lock:
+            self.stage_totals = {name: 0.0 for name in STAGES}
+            self.stage_counts = {name: 0 for name in STAGES}
+            self.stage_max = {name: 0.0 for name in STAGES}
+            self.num_steps = 0
+            self.num_samples = 0
+            self.paused_seconds = 0.0
+            self.start_time = time.perf_counter()
+        if torch.cuda.is_available():
+            torch.cuda.reset_peak_memory_stats()
+
+    def _record(self, name: str, elapsed: float):
+        with self._lock:
+            self.stage_totals[name] = self.stage_totals.get(name, 0.0) + elapsed
+            self.stage_counts[name] = self.stage_counts.get(name, 0) + 1
+            if elapsed > self.stage_max.get(name, 0.0):
+                self.stage_max[name] = elapsed
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block under the given stage name"""
+        if self.synchronize:
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.synchronize:
+                torch.cuda.synchronize()
+            self._record(name, time.perf_counter() - start)
+
+    @contextmanager
+    def paused(self):
+        """Exclude the enclosed block (e.g. validation) from elapsed time and throughput"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.paused_seconds += time.perf_counter() - start
+
+    def iter_loader(self, loader: Iterable) -> Iterator:
+        """Wrap a DataLoader so time spent waiting for batches is recorded"""
+        iterator = iter(loader)
+        while True:
+            start = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            self._record('data_loader_wait', time.perf_counter() - start)
+            yield batch
+
+    def step(self, num_samples: int = 0):
+        """Mark the end of a training or inference step"""
+        with self._lock:
+            self.num_steps += 1
+            self.num_samples += num_samples
+            step_idx = self.num_steps
+
+        if self.trace_steps is not None:
+            self._advance_trace(step_idx)
+
+    def _advance_trace(self, step_idx: int):
+        """Start or stop the torch.profiler trace at the configured step window"""
+        trace_start, trace_end = self.trace_steps
+
+        if step_idx == trace_start and self._torch_profiler is None:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self._torch_profiler = torch.profiler.profile(
+                activities=activities,
+                record_shapes=True,
+                profile_memory=True
+            )
+            self._torch_profiler.__enter__()
+            print(f"torch.profiler trace started at step {step_idx}")
+        elif step_idx == trace_end and self._torch_profiler is not None:
+            self._torch_profiler.__exit__(None, None, None)
+            os.makedirs(self.trace_dir, exist_ok=True)
+            trace_path = os.path.join(
+                self.trace_dir, f"trace_steps_{trace_start}_{trace_end}_{os.getpid()}.json"
+            )
+            self._torch_profiler.export_chrome_trace(trace_path)
+            self._torch_profiler = None
+            print(f"torch.profiler trace saved to {trace_path}")
+
+    def peak_memory(self) -> Dict[str, int]:
+        """Return peak memory usage in bytes per device"""
+        memory = {}
+        if resource is not None:
+            # ru_maxrss is reported in kilobytes on Linux
+            memory['host'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        if torch.cuda.is_available():
+            memory['cuda'] = torch.cuda.max_memory_allocated()
+        return memory
+
+    def summary(self) -> Dict:
+        """Return a snapshot of the collected statistics"""
+        with self._lock:
+            elapsed = time.perf_counter() - self.start_time - self.paused_seconds
+            stages = {
+                name: {
+                    'total_seconds': self.stage_totals[name],
+                    'count': self.stage_counts[name],
+                    'mean_seconds': self.stage_totals[name] / self.stage_counts[name] if self.stage_counts[name] else 0.0,
+                    'max_seconds': self.stage_max[name]
+                }
+                for name in self.stage_totals
+            }
+            num_steps = self.num_steps
+            num_samples = self.num_samples
+
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'steps': num_steps,
+            'samples': num_samples,
+            'elapsed_seconds': elapsed,
+            'samples_per_second': num_samples / elapsed if elapsed > 0 else 0.0,
+            'peak_memory_bytes': self.peak_memory(),
+            'stages': stages
+        }
+
+    def to_prometheus(self, prefix: str = 'robertanet') -> str:
+        """Render the statistics in the Prometheus text exposition format"""
+        return render_prometheus(self.summary(), prefix)
+
+    def write_prometheus(self, path: str):
+        """Write metrics to a file for the node-exporter textfile collector"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def append_jsonl(self, path: str, **extra):
+        """Append one JSON line with the current summary"""
+        record = self.summary()
+        record.update(extra)
+        with open(path, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+
+    def print_summary(self):
+        """Print a human-readable breakdown of time per stage"""
+        summary = self.summary()
+        total = sum(stats['total_seconds'] for stats in summary['stages'].values())
+        print(f"Profile: {summary['steps']} steps, {summary['samples_per_second']:.2f} samples/s")
+        for name, stats in summary['stages'].items():
+            if stats['count'] == 0:
+                continue
+            share = stats['total_seconds'] / total * 100 if total > 0 else 0.0
+            print(f"  {name:<18} {stats['total_seconds']:8.3f}s  {share:5.1f}%  "
+                  f"mean {stats['mean_seconds'] * 1000:.2f}ms  max {stats['max_seconds'] * 1000:.2f}ms")
+        for device, value in summary['peak_memory_bytes'].items():
+            print(f"  peak {device} memory: {value / 1024 ** 2:.1f} MB")
+
+def merge_summaries(summaries: List[Dict]) -> Dict:
+    """
+    Combine summaries of profilers that ran side by side (e.g. one per serving worker):
+    totals, counts, throughput and host memory add up, maxima take the largest
+    """
+    stages: Dict[str, Dict] = {}
+    for summary in summaries:
+        for name, stats in summary['stages'].items():
+            merged = stages.setdefault(name, {'total_seconds': 0.0, 'count': 0,
+                                              'mean_seconds': 0.0, 'max_seconds': 0.0})
+            merged['total_seconds'] += stats['total_seconds']
+            merged['count'] += stats['count']
+            merged['max_seconds'] = max(merged['max_seconds'], stats['max_seconds'])
+    for merged in stages.values():
+        merged['mean_seconds'] = merged['total_seconds'] / merged['count'] if merged['count'] else 0.0
+
+    peak_memory: Dict[str, int] = {}
+    for summary in summaries:
+        for device, value in summary['peak_memory_bytes'].items():
+            peak_memory[device] = peak_memory.get(device, 0) + value
+
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'steps': sum(summary['steps'] for summary in summaries),
+        'samples': sum(summary['samples'] for summary in summaries),
+        'elapsed_seconds': max((summary['elapsed_seconds'] for summary in summaries), default=0.0),
+        'samples_per_second': sum(summary['samples_per_second'] for summary in summaries),
+        'peak_memory_bytes': peak_memory,
+        'stages': stages
+    }
+
+def render_prometheus(summary: Dict, prefix: str = 'robertanet') -> str:
+    """Render a StageProfiler summary in the Prometheus text exposition format"""
+    lines = [
+        f"# HELP {prefix}_stage_seconds_total Cumulative wall-clock seconds per stage",
+        f"# TYPE {prefix}_stage_seconds_total counter"
+    ]
+    for name, stats in summary['stages'].items():
+        lines.append(f'{prefix}_stage_seconds_total{{stage="{name}"}} {stats["total_seconds"]:.6f}')
+
+    lines.append(f"# HELP {prefix}_stage_calls_total Number of timed calls per stage")
+    lines.append(f"# TYPE {prefix}_stage_calls_total counter")
+    for name, stats in summary['stages'].items():
+        lines.append(f'{prefix}_stage_calls_total{{stage="{name}"}} {stats["count"]}')
+
+    lines.append(f"# HELP {prefix}_stage_max_seconds Slowest single call per stage")
+    lines.append(f"# TYPE {prefix}_stage_max_seconds gauge")
+    for name, stats in summary['stages'].items():
+        lines.append(f'{prefix}_stage_max_seconds{{stage="{name}"}} {stats["max_seconds"]:.6f}')
+
+    lines.extend([
+        f"# HELP {prefix}_steps_total Completed steps",
+        f"# TYPE {prefix}_steps_total counter",
+        f"{prefix}_steps_total {summary['steps']}",
+        f"# HELP {prefix}_samples_total Processed samples",
+        f"# TYPE {prefix}_samples_total counter",
+        f"{prefix}_samples_total {summary['samples']}",
+        f"# HELP {prefix}_samples_per_second Average throughput since reset",
+        f"# TYPE {prefix}_samples_per_second gauge",
+        f"{prefix}_samples_per_second {summary['samples_per_second']:.4f}",
+        f"# HELP {prefix}_peak_memory_bytes Peak memory usage per device",
+        f"# TYPE {prefix}_peak_memory_bytes gauge"
+    ])
+    for device, value in summary['peak_memory_bytes'].items():
+        lines.append(f'{prefix}_peak_memory_bytes{{device="{device}"}} {value}')
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,265 @@
+"""
+Structured attention-head and layer pruning for the RoBERTa encoder inside RoBERTaNET
+Scores heads and layers by mask sensitivity on the validation set, removes the least
+important ones down to a FLOP budget, fine-tunes briefly and reports speedup against F1
+"""
+
+import argparse
+import os
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader
+from transformers import RobertaConfig
+
+from model_architecture import RoBERTaNET, create_model, load_model_from_checkpoint
+from data_preprocessing import create_sample_dataset, load_vocab, prepare_data
+from model_evaluation import ModelEvaluator
+from train_model import ModelTrainer
+
+def compute_importance(model: RoBERTaNET,
+                       data_loader: DataLoader,
+                       device: str = 'cpu',
+                       max_batches: int = None) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Estimate head and layer importance with gradient-based mask sensitivity.
+
+    Every head output and every layer's residual update is multiplied by a gate
+    fixed at 1; the accumulated |dL/dgate| over the data is the importance.
+    Gates are applied with forward hooks, so this works with eager and SDPA attention.
+    """
+    layers = model.roberta.encoder.layer
+    num_heads = max(layer.attention.self.num_attention_heads for layer in layers)
+    head_gates = torch.ones(len(layers), num_heads, device=device, requires_grad=True)
+    layer_gates = torch.ones(len(layers), device=device, requires_grad=True)
+
+    def head_hook(layer_idx):
+        def hook(module, inputs, output):
+            context = output[0] if isinstance(output, tuple) else output
+            batch_size, seq_len, width = context.shape
+            heads = module.num_attention_heads
+            gates = head_gates[layer_idx, :heads].view(1, 1, heads, 1)
+            gated = (context.view(batch_size, seq_len, heads, width // heads) * gates).view(batch_size, seq_len, width)
+            return (gated,) + tuple(output[1:]) if isinstance(output, tuple) else gated
+        return hook
+
+    def layer_hook(layer_idx):
+        def hook(module, args, kwargs, output):
+            hidden_in = args[0] if args else kwargs['hidden_states']
+            hidden_out = output[0] if isinstance(output, tuple) else output
+            gated = hidden_in + layer_gates[layer_idx] * (hidden_out - hidden_in)
+            return (gated,) + tuple(output[1:]) if isinstance(output, tuple) else gated
+        return hook
+
+    handles = []
+    for layer_idx, layer in enumerate(layers):
+        handles.append(layer.attention.self.register_forward_hook(head_hook(layer_idx)))
+        handles.append(layer.register_forward_hook(layer_hook(layer_idx), with_kwargs=True))
+
+    # Only the gates need gradients
+    requires_grad = {name: p.requires_grad for name, p in model.named_parameters()}
+    for p in model.parameters():
+        p.requires_grad_(False)
+
+    model.to(device)
+    model.eval()
+    criterion = nn.CrossEntropyLoss()
+    head_importance = torch.zeros_like(head_gates)
+    layer_importance = torch.zeros_like(layer_gates)
+
+    try:
+        for batch_idx, batch in enumerate(data_loader):
+            if max_batches is not None and batch_idx >= max_batches:
+                break
+            logits = model(
+                batch['input_ids'].to(device),
+                batch['attention_mask'].to(device),
+                batch['glove_input_ids'].to(device)
+            )
+            loss = criterion(logits, batch['labels'].to(device))
+            head_grad, layer_grad = torch.autograd.grad(loss, [head_gates, layer_gates])
+            head_importance += head_grad.abs()
+            layer_importance += layer_grad.abs()
+    finally:
+        for handle in handles:
+            handle.remove()
+        for name, p in model.named_parameters():
+            p.requires_grad_(requires_grad[name])
+
+    # Normalize head scores within each layer (Michel et al., 2019)
+    norms = head_importance.norm(dim=1, keepdim=True).clamp_min(1e-12)
+    return (head_importance / norms).cpu(), layer_importance.cpu()
+
+def encoder_flops(heads_per_layer: List[int], hidden: int, head_dim: int, ffn: int, seq_len: int) -> float:
+    """Approximate encoder FLOPs for one sequence (multiply-adds counted as two)"""
+    total = 0.0
+    for heads in heads_per_layer:
+        # Q/K/V and output projections, attention scores and weighted sum, then the FFN
+        total += seq_len * heads * 8 * hidden * head_dim
+        total += heads * 4 * seq_len * seq_len * head_dim
+        total += seq_len * 4 * hidden * ffn
+    return total
+
+def select_pruning(head_importance: torch.Tensor,
+                   layer_importance: torch.Tensor,
+                   config,
+                   target_ratio: float,
+                   seq_len: int) -> Tuple[List[int], Dict[int, List[int]], float]:
+    """
+    Greedily drop the heads and layers with the lowest importance per FLOP
+    until the encoder is within target_ratio of its original FLOPs.
+    """
+    num_layers, num_heads = head_importance.shape
+    hidden = config.hidden_size
+    head_dim = hidden // config.num_attention_heads
+    ffn = config.intermediate_size
+
+    head_cost = seq_len * 8 * hidden * head_dim + 4 * seq_len * seq_len * head_dim
+    ffn_cost = seq_len * 4 * hidden * ffn
+
+    # Importance as a share of the total so heads and layers are comparable
+    head_share = head_importance / head_importance.sum().clamp_min(1e-12)
+    layer_share = layer_importance / layer_importance.sum().clamp_min(1e-12)
+
+    units = []
+    for layer in range(num_layers):
+        units.append((float(layer_share[layer]) / (num_heads * head_cost + ffn_cost), 'layer', layer, None))
+        for head in range(num_heads):
+            units.append((float(head_share[layer, head]) / head_cost, 'head', layer, head))
+    units.sort(key=lambda unit: unit[0])
+
+    remaining = {layer: set(range(num_heads)) for layer in range(num_layers)}
+    original = encoder_flops([num_heads] * num_layers, hidden, head_dim, ffn, seq_len)
+
+    def current_flops():
+        return encoder_flops([len(heads) for heads in remaining.values()], hidden, head_dim, ffn, seq_len)
+
+    for _, kind, layer, head in units:
+        if current_flops() <= target_ratio * original:
+            break
+        if layer not in remaining:
+            continue
+        if kind == 'layer' or remaining[layer] == {head}:
+            # Removing the last head of a layer removes the whole layer
+            if len(remaining) > 1:
+                del remaining[layer]
+        else:
+            remaining[layer].discard(head)
+
+    keep_layers = sorted(remaining)
+    heads_to_prune = {}
+    for position, layer in enumerate(keep_layers):
+        pruned = sorted(set(range(num_heads)) - remaining[layer])
+        if pruned:
+            heads_to_prune[position] = pruned
+
+    return keep_layers, heads_to_prune, current_flops() / original
+
+def measure_latency(model: RoBERTaNET, data_loader: DataLoader, device: str = 'cpu', repeats: int = 3) -> float:
+    """Median seconds for a full inference pass over a loader"""
+    evaluator = ModelEvaluator(model, device=device)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        evaluator.predict(data_loader)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+def evaluate_f1(model: RoBERTaNET, data_loader: DataLoader, device: str = 'cpu') -> float:
+    evaluator = ModelEvaluator(model, device=device)
+    y_true, y_pred, y_prob = evaluator.predict(data_loader)
+    return evaluator.compute_metrics(y_true, y_pred, y_prob)['f1_weighted']
+
+def main():
+    """Main pruning function"""
+    parser = argparse.ArgumentParser(description='Prune RoBERTaNET encoder heads and layers to a FLOP budget')
+    parser.add_argument('--checkpoint', default='robertanet_best_model.pth')
+    parser.add_argument('--vocab', default='robertanet_vocab.json',
+                        help='Vocabulary the checkpoint was trained with')
+    parser.add_argument('--target-flops', type=float, default=0.5,
+                        help='Fraction of the original encoder FLOPs to keep')
+    parser.add_argument('--max-length', type=int, default=128)
+    parser.add_argument('--importance-batches', type=int, default=None)
+    parser.add_argument('--finetune-epochs', type=int, default=1)
+    parser.add_argument('--learning-rate', type=float, default=2e-5)
+    parser.add_argument('--output', default='robertanet_pruned_model.pth')
+    args = parser.parse_args()
+
+    print("RoBERTaNET Structured Pruning")
+    print("=" * 50)
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    print("\n1. Loading data and model...")
+    df = create_sample_dataset()
+    train_loader, val_loader, test_loader, data_info = prepare_data(df, max_length=args.max_length)
+    if os.path.exists(args.checkpoint):
+        # GloVe ids must follow the vocabulary the checkpoint was trained with
+        model, _ = load_model_from_checkpoint(args.checkpoint, device=device)
+        vocab = load_vocab(args.vocab)
+    else:
+        print(f"Checkpoint {args.checkpoint} not found; pruning an untrained model")
+        model = create_model({'vocab_size': data_info['vocab_size'], 'num_classes': data_info['num_classes'],
+                              'max_length': args.max_length})
+        vocab = data_info['vocab']
+
+    if len(vocab) != model.glove_embedding.vocab_size:
+        raise ValueError(f"Vocabulary {args.vocab} has {len(vocab)} words but the GloVe table has "
+                         f"{model.glove_embedding.vocab_size} rows; pass the vocabulary the checkpoint was trained with")
+    # Score, fine-tune and evaluate with the checkpoint's vocabulary, not the one rebuilt from the sample split
+    for loader in (train_loader, val_loader, test_loader):
+        loader.dataset.vocab = vocab
+
+    # prune_encoder rewrites config.num_hidden_layers, so compare with the original architecture
+    original_layers = RobertaConfig.from_pretrained(model.roberta_model_name).num_hidden_layers
+    if model.pruned_heads or model.encoder_layers != list(range(original_layers)):
+        # Layer and head indices below are positions in the full encoder
+        raise ValueError("Start pruning from an unpruned checkpoint")
+
+    baseline_f1 = evaluate_f1(model, test_loader, device)
+    baseline_latency = measure_latency(model, test_loader, device)
+
+    print("\n2. Scoring heads and layers on the validation set...")
+    head_importance, layer_importance = compute_importance(model, val_loader, device, args.importance_batches)
+
+    keep_layers, heads_to_prune, flop_ratio = select_pruning(
+        head_importance, layer_importance, model.roberta.config, args.target_flops, args.max_length
+    )
+    num_pruned_heads = sum(len(heads) for heads in heads_to_prune.values())
+    print(f"Keeping layers {keep_layers}, pruning {num_pruned_heads} more heads "
+          f"-> {flop_ratio:.1%} of encoder FLOPs")
+
+    print("\n3. Pruning and fine-tuning...")
+    model.prune_encoder(keep_layers, heads_to_prune)
+    trainer = ModelTrainer(model, device=device, learning_rate=args.learning_rate)
+    for epoch in range(args.finetune_epochs):
+        train_loss, train_acc = trainer.train_epoch(train_loader)
+        print(f"Fine-tune epoch {epoch + 1}: loss {train_loss:.4f}, acc {train_acc:.4f}")
+
+    pruned_f1 = evaluate_f1(model, test_loader, device)
+    pruned_latency = measure_latency(model, test_loader, device)
+
+    report = {
+        'target_flops': args.target_flops,
+        'flop_ratio': flop_ratio,
+        'encoder_layers': keep_layers,
+        'pruned_heads': {str(pos): heads for pos, heads in model.pruned_heads.items()},
+        'baseline_f1': baseline_f1,
+        'pruned_f1': pruned_f1,
+        'f1_change': pruned_f1 - baseline_f1,
+        'baseline_latency_seconds': baseline_latency,
+        'pruned_latency_seconds': pruned_latency,
+        'speedup': baseline_latency / pruned_latency if pruned_latency > 0 else None
+    }
+    trainer.save_checkpoint(args.output, pruning=report)
+
+    print(f"\nPruning Results:")
+    print(f"Speedup: {report['speedup']:.2f}x ({baseline_latency:.3f}s -> {pruned_latency:.3f}s)")
+    print(f"F1: {baseline_f1:.4f} -> {pruned_f1:.4f} ({report['f1_change']:+.4f})")
+    print(f"Pruned checkpoint saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
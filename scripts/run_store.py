@@ -0,0 +1,150 @@
+"""
+Append-only run tracking for RoBERTaNET training
+Each run gets a directory with small metadata/summary files, an append-only
+metrics.jsonl written per step and per epoch, and separate artifact files
+(e.g. the vocabulary). runs/index.jsonl lists runs so readers never scan directories.
+
+Layout:
+    runs/index.jsonl                  one 'start' and one 'finish' event per run
+    runs/<run_id>/meta.json           model config, data info (without vocab), artifact paths
+    runs/<run_id>/metrics.jsonl       {'seq', 'kind': 'step'|'epoch', ...} records
+    runs/<run_id>/summary.json        best/test metrics, written when the run finishes
+    runs/<run_id>/artifacts/*.json    large artifacts such as vocab.json
+"""
+
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+def _write_json_atomic(path: str, data: Dict):
+    """Write JSON to a temporary file and rename it so readers never see a partial file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+class RunLogger:
+    """Writes the metrics and artifacts of one run"""
+
+    def __init__(self, store: 'RunStore', run_id: str, step_interval: int = 1):
+        self.store = store
+        self.run_id = run_id
+        self.run_dir = os.path.join(store.root, run_id)
+        self.step_interval = max(step_interval, 1)
+        self.seq = 0
+        self._metrics_file = open(os.path.join(self.run_dir, 'metrics.jsonl'), 'a')
+        self._artifacts: Dict[str, str] = {}
+
+    def _append(self, record: Dict):
+        self.seq += 1
+        record = {'seq': self.seq, 'time': time.time(), **record}
+        self._metrics_file.write(json.dumps(record) + "\n")
+
+    def log_step(self, step: int, epoch: int, **metrics):
+        """Record a training step (every `step_interval` steps)"""
+        if step % self.step_interval == 0:
+            self._append({'kind': 'step', 'step': step, 'epoch': epoch, **metrics})
+
+    def log_epoch(self, epoch: int, **metrics):
+        """Record end-of-epoch metrics and flush so readers see whole epochs"""
+        self._append({'kind': 'epoch', 'epoch': epoch, **metrics})
+        self._metrics_file.flush()
+
+    def save_artifact(self, name: str, data) -> str:
+        """Store a JSON artifact next to the run and return its path"""
+        artifact_dir = os.path.join(self.run_dir, 'artifacts')
+        os.makedirs(artifact_dir, exist_ok=True)
+        path = os.path.join(artifact_dir, name)
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        self._artifacts[os.path.splitext(name)[0]] = os.path.join('artifacts', name)
+
+        meta_path = os.path.join(self.run_dir, 'meta.json')
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        meta['artifacts'] = dict(self._artifacts)
+        _write_json_atomic(meta_path, meta)
+        return path
+
+    def finish(self, summary: Dict, status: str = 'completed'):
+        """Write the run summary and close the run in the index"""
+        self._metrics_file.flush()
+        self._metrics_file.close()
+        summary = {'run_id': self.run_id, 'status': status, **summary}
+        _write_json_atomic(os.path.join(self.run_dir, 'summary.json'), summary)
+        self.store._append_index({
+            'event': 'finish',
+            'run_id': self.run_id,
+            'status': status,
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'best_val_acc': summary.get('best_val_acc'),
+            'test_f1': summary.get('test_metrics', {}).get('f1')
+        })
+
+class RunStore:
+    """Directory of append-only training runs"""
+
+    def __init__(self, root: str = 'runs'):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.index_path = os.path.join(root, 'index.jsonl')
+
+    def _append_index(self, record: Dict):
+        with open(self.index_path, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+
+    def create_run(self,
+                   model_config: Dict,
+                   data_info: Dict,
+                   run_id: Optional[str] = None,
+                   step_interval: int = 1) -> RunLogger:
+        """Start a run; `data_info` should not contain large artifacts such as the vocab"""
+        run_id = run_id or f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        run_dir = os.path.join(self.root, run_id)
+        os.makedirs(run_dir)
+        started_at = datetime.now().isoformat(timespec='seconds')
+
+        _write_json_atomic(os.path.join(run_dir, 'meta.json'), {
+            'run_id': run_id,
+            'started_at': started_at,
+            'model_config': model_config,
+            'data_info': data_info,
+            'artifacts': {}
+        })
+        self._append_index({
+            'event': 'start',
+            'run_id': run_id,
+            'started_at': started_at,
+            'fusion_method': model_config.get('fusion_method')
+        })
+        return RunLogger(self, run_id, step_interval=step_interval)
+
+    def list_runs(self) -> List[Dict]:
+        """Runs in start order, with start and finish events merged"""
+        runs: Dict[str, Dict] = {}
+        if not os.path.exists(self.index_path):
+            return []
+        with open(self.index_path, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                run = runs.setdefault(event['run_id'], {'status': 'running'})
+                run.update({key: value for key, value in event.items() if key != 'event'})
+        return list(runs.values())
+
+    def read_metrics(self, run_id: str, kind: Optional[str] = None, since: int = 0) -> List[Dict]:
+        """Metric records of a run with seq > since, optionally of one kind"""
+        records = []
+        with open(os.path.join(self.root, run_id, 'metrics.jsonl'), 'r') as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    # Partially written last line
+                    break
+                record = json.loads(line)
+                if record['seq'] > since and (kind is None or record['kind'] == kind):
+                    records.append(record)
+        return records
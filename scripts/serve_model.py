@@ -0,0 +1,529 @@
+"""
+Multi-replica CPU serving for RoBERTaNET
+The parent loads the checkpoint once into shared memory (or a memory-mapped file),
+forks pinned worker processes that use those weights zero-copy, and balances requests across them
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Empty
+from typing import Dict, List, Optional, Tuple
+
+import torch
+import torch.multiprocessing as mp
+
+from model_architecture import load_model_from_checkpoint
+from data_preprocessing import load_vocab
+from long_text_inference import LongTextScorer, create_long_text_scorer
+from explain_predictions import ExplanationService, TokenAttributionEngine
+from profiler import StageProfiler, merge_summaries, render_prometheus
+
+MAX_TEXT_LENGTH = 5000
+
+def available_cores() -> List[int]:
+    """Cores this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def partition_cores(num_workers: int, reserved: int = 0) -> List[List[int]]:
+    """
+    Split the cores available to this process into disjoint sets, one per worker.
+    The last `reserved` cores are left out for the parent.
+    """
+    cores = available_cores()
+    cores = cores[:len(cores) - reserved]
+
+    if num_workers > len(cores):
+        raise ValueError(f"Cannot pin {num_workers} workers to {len(cores)} cores")
+
+    chunk, remainder = divmod(len(cores), num_workers)
+    core_sets = []
+    start = 0
+    for worker_id in range(num_workers):
+        end = start + chunk + (1 if worker_id < remainder else 0)
+        core_sets.append(cores[start:end])
+        start = end
+    return core_sets
+
+def format_result(result: Dict, text: str, processing_time: float) -> Dict:
+    """Shape a scorer result like the /api/analyze response"""
+    bullying_probability = result['bullying_probability']
+    if bullying_probability > 0.7:
+        risk_level = 'high'
+    elif bullying_probability > 0.4:
+        risk_level = 'medium'
+    else:
+        risk_level = 'low'
+
+    return {
+        'prediction': 'bullying' if bullying_probability > 0.5 else 'non-bullying',
+        'confidence': result['confidence'],
+        'bullying_probability': bullying_probability,
+        'non_bullying_probability': result['non_bullying_probability'],
+        'processing_time': processing_time,
+        'word_count': len(text.split()),
+        'risk_level': risk_level,
+        'num_windows': result['num_windows'],
+        'spans': result['spans']
+    }
+
+def flagged_spans(texts: List[str], results: List[Dict]) -> Tuple[List[str], List[float], List[Dict]]:
+    """Text, window score and offsets of every offending span, for the explanation service"""
+    span_texts, scores, spans = [], [], []
+    for text, result in zip(texts, results):
+        for span in result['spans']:
+            span_texts.append(text[span['start']:span['end']])
+            scores.append(span['score'])
+            spans.append({'start': span['start'], 'end': span['end']})
+    return span_texts, scores, spans
+
+def _swap_weights(model, weights):
+    """Point the model at new weights: a shared-memory state dict or a checkpoint path to mmap"""
+    if isinstance(weights, str):
+        weights = torch.load(weights, map_location='cpu', mmap=True, weights_only=True)['model_state_dict']
+    model.load_state_dict(weights, assign=True)
+    model.eval()
+
+def _worker_main(worker_id: int,
+                 cores: List[int],
+                 intra_op_threads: int,
+                 inter_op_threads: int,
+                 scorer: LongTextScorer,
+                 request_queue,
+                 response_queue,
+                 max_batch_requests: int,
+                 profile: bool = False):
+    """Worker loop: micro-batch queued requests and score them in one pass"""
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    # Each worker profiles itself; the parent collects the summaries for /metrics
+    profiler = StageProfiler() if profile else None
+    scorer.set_profiler(profiler)
+    torch.set_num_threads(intra_op_threads)
+    try:
+        torch.set_num_interop_threads(inter_op_threads)
+    except RuntimeError:
+        # Only settable before the first parallel region in this process
+        pass
+
+    print(f"Worker {worker_id} (pid {os.getpid()}) pinned to cores {cores}, "
+          f"{intra_op_threads} intra-op / {inter_op_threads} inter-op threads")
+
+    running = True
+    while running:
+        messages = [request_queue.get()]
+        # Drain whatever else is already waiting, up to the micro-batch limit
+        while len(messages) < max_batch_requests:
+            try:
+                messages.append(request_queue.get_nowait())
+            except Empty:
+                break
+
+        requests = []
+        for message in messages:
+            if message[0] == 'stop':
+                running = False
+            elif message[0] == 'reload':
+                # Swap weights between batches so each request sees one consistent model
+                _, request_id, weights = message
+                try:
+                    _swap_weights(scorer.model, weights)
+                    response_queue.put((worker_id, request_id, {'reloaded': True}, None))
+                except Exception as e:
+                    response_queue.put((worker_id, request_id, None, f"{type(e).__name__}: {e}"))
+            elif message[0] == 'metrics':
+                _, request_id, _ = message
+                response_queue.put((worker_id, request_id, profiler.summary() if profiler else None, None))
+            elif message[0] == 'predict':
+                requests.append(message)
+
+        if not requests:
+            continue
+
+        texts = [text for _, _, request_texts in requests for text in request_texts]
+        try:
+            results = scorer.score(texts)
+            error = None
+        except Exception as e:
+            results = []
+            error = f"{type(e).__name__}: {e}"
+
+        offset = 0
+        for _, request_id, request_texts in requests:
+            request_results = results[offset:offset + len(request_texts)] if error is None else None
+            offset += len(request_texts)
+            response_queue.put((worker_id, request_id, request_results, error))
+
+class WorkerPool:
+    """Pre-forked pool of pinned inference workers with least-outstanding dispatch"""
+
+    def __init__(self,
+                 scorer: LongTextScorer,
+                 num_workers: int,
+                 intra_op_threads: Optional[int] = None,
+                 inter_op_threads: int = 1,
+                 max_batch_requests: int = 8,
+                 reserved_cores: int = 0,
+                 profile: bool = False):
+
+        self.scorer = scorer
+        self.num_workers = num_workers
+        self.core_sets = partition_cores(num_workers, reserved_cores)
+        # Cores no worker is pinned to, for work done in the parent
+        cores = available_cores()
+        self.parent_cores = cores[len(cores) - reserved_cores:] if reserved_cores else []
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.max_batch_requests = max_batch_requests
+        self.profile = profile
+
+        # fork lets workers inherit the shared weights without re-loading them
+        self.context = mp.get_context('fork')
+        self.request_queues = []
+        self.response_queue = self.context.Queue()
+        self.processes = []
+        self.outstanding = [0] * num_workers
+        self.pending: Dict[int, Future] = {}
+        self.next_request_id = 0
+        self.lock = threading.Lock()
+        self.collector = None
+        self.current_weights = None
+
+    def start(self):
+        """Fork the workers and start collecting their responses"""
+        for worker_id, cores in enumerate(self.core_sets):
+            request_queue = self.context.Queue()
+            process = self.context.Process(
+                target=_worker_main,
+                args=(worker_id, cores, self.intra_op_threads or len(cores), self.inter_op_threads,
+                      self.scorer, request_queue, self.response_queue, self.max_batch_requests, self.profile),
+                daemon=True
+            )
+            process.start()
+            self.request_queues.append(request_queue)
+            self.processes.append(process)
+
+        self.collector = threading.Thread(target=self._collect, daemon=True)
+        self.collector.start()
+
+    def _collect(self):
+        while True:
+            worker_id, request_id, results, error = self.response_queue.get()
+            with self.lock:
+                self.outstanding[worker_id] -= 1
+                future = self.pending.pop(request_id, None)
+            if future is None:
+                continue
+            if error is not None:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(results)
+
+    def _send(self, worker_id: Optional[int], kind: str, payload) -> Future:
+        """Queue a message for one worker (the least loaded if worker_id is None)"""
+        future = Future()
+        with self.lock:
+            if worker_id is None:
+                worker_id = min(range(self.num_workers), key=lambda i: self.outstanding[i])
+            request_id = self.next_request_id
+            self.next_request_id += 1
+            self.outstanding[worker_id] += 1
+            self.pending[request_id] = future
+        self.request_queues[worker_id].put((kind, request_id, payload))
+        return future
+
+    def submit(self, texts: List[str]) -> Future:
+        """Send texts to the worker with the fewest requests in flight"""
+        return self._send(None, 'predict', texts)
+
+    def reload(self, checkpoint_path: str, weights_mode: str = 'shm', timeout: float = 120.0) -> Dict:
+        """Hot-swap new checkpoint weights into every worker"""
+        if weights_mode == 'shm':
+            # Load once in the parent; workers receive shared-memory handles, not copies
+            model, checkpoint = load_model_from_checkpoint(checkpoint_path, weights_only=True)
+            del checkpoint
+            weights = model.state_dict()
+            for tensor in weights.values():
+                tensor.share_memory_()
+        else:
+            weights = checkpoint_path
+
+        futures = [self._send(worker_id, 'reload', weights) for worker_id in range(self.num_workers)]
+        for future in futures:
+            future.result(timeout=timeout)
+
+        # Keep the shared weights alive for as long as workers use them
+        self.current_weights = weights
+        return {'reloaded': self.num_workers, 'checkpoint': checkpoint_path}
+
+    def metrics(self, timeout: float = 10.0) -> Optional[Dict]:
+        """Stage profiles of all workers merged into one summary (None without profiling)"""
+        if not self.profile:
+            return None
+        futures = [self._send(worker_id, 'metrics', None) for worker_id in range(self.num_workers)]
+        return merge_summaries([future.result(timeout=timeout) for future in futures])
+
+    def status(self) -> Dict:
+        """Return liveness and load of each worker"""
+        with self.lock:
+            outstanding = list(self.outstanding)
+        return {
+            'workers': [
+                {
+                    'worker_id': worker_id,
+                    'pid': process.pid,
+                    'alive': process.is_alive(),
+                    'cores': self.core_sets[worker_id],
+                    'outstanding': outstanding[worker_id]
+                }
+                for worker_id, process in enumerate(self.processes)
+            ]
+        }
+
+    def stop(self):
+        """Ask every worker to exit and wait for them"""
+        for request_queue in self.request_queues:
+            request_queue.put(('stop',))
+        for process in self.processes:
+            process.join(timeout=10)
+
+def make_handler(pool: WorkerPool,
+                 request_timeout: float,
+                 checkpoint_path: str,
+                 weights_mode: str = 'shm',
+                 explainer: Optional[ExplanationService] = None):
+    """Build an HTTP handler class bound to a worker pool (and optional explanation service)"""
+    # Reloads only ever re-read the checkpoint the server was started with
+    checkpoint_path = os.path.abspath(checkpoint_path)
+
+    class InferenceHandler(BaseHTTPRequestHandler):
+
+        def _send_json(self, payload: Dict, status: int = 200):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/health':
+                status = pool.status()
+                if explainer is not None:
+                    status['explanations'] = {'queued': explainer.queue.qsize(), 'dropped': explainer.dropped}
+                self._send_json(status)
+            elif self.path == '/metrics':
+                self._handle_metrics()
+            else:
+                self._send_json({'error': 'Not found'}, status=404)
+
+        def _handle_metrics(self):
+            try:
+                summary = pool.metrics()
+            except Exception as e:
+                self._send_json({'error': 'Could not collect worker metrics', 'details': str(e)}, status=500)
+                return
+            if summary is None:
+                self._send_json({'error': 'Start the server with --profile to export metrics'}, status=404)
+                return
+
+            text = render_prometheus(summary)
+            if explainer is not None:
+                text += (
+                    "# HELP robertanet_explanations_dropped_total High-risk items dropped from a full explanation queue\n"
+                    "# TYPE robertanet_explanations_dropped_total counter\n"
+                    f"robertanet_explanations_dropped_total {explainer.dropped}\n"
+                )
+            body = text.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if self.path == '/admin/reload':
+                self._handle_reload()
+                return
+            if self.path not in ('/analyze', '/api/analyze'):
+                self._send_json({'error': 'Not found'}, status=404)
+                return
+
+            start_time = time.perf_counter()
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+            except (ValueError, json.JSONDecodeError):
+                self._send_json({'error': 'Request body must be JSON'}, status=400)
+                return
+            if not isinstance(payload, dict):
+                self._send_json({'error': 'Request body must be a JSON object'}, status=400)
+                return
+
+            texts = payload.get('texts')
+            single = texts is None
+            if single:
+                texts = [payload.get('text')]
+
+            if not isinstance(texts, list) or not texts or not all(isinstance(t, str) and t for t in texts):
+                self._send_json({'error': 'Text is required and must be a string'}, status=400)
+                return
+            if any(len(t) > MAX_TEXT_LENGTH for t in texts):
+                self._send_json({'error': f'Text is too long. Maximum {MAX_TEXT_LENGTH} characters allowed.'}, status=400)
+                return
+
+            try:
+                results = pool.submit(texts).result(timeout=request_timeout)
+            except Exception as e:
+                self._send_json({'error': 'Internal server error during analysis', 'details': str(e)}, status=500)
+                return
+
+            processing_time = (time.perf_counter() - start_time) * 1000
+            formatted = [format_result(r, t, processing_time) for r, t in zip(results, texts)]
+            self._send_json(formatted[0] if single else {'results': formatted})
+
+            if explainer is not None:
+                # Flagged windows of high-risk items are explained after the response is sent,
+                # in the parent; spans, not the head of the text, are what drove the score
+                explainer.submit(*flagged_spans(texts, results))
+
+        def _handle_reload(self):
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+            except (ValueError, json.JSONDecodeError):
+                self._send_json({'error': 'Body must be JSON'}, status=400)
+                return
+            if not isinstance(payload, dict):
+                self._send_json({'error': 'Body must be a JSON object'}, status=400)
+                return
+            requested = payload.get('checkpoint')
+            if requested is not None and os.path.abspath(str(requested)) != checkpoint_path:
+                self._send_json({'error': 'Only the checkpoint the server was started with can be reloaded'},
+                                status=400)
+                return
+
+            try:
+                result = pool.reload(checkpoint_path, weights_mode)
+                if explainer is not None:
+                    with explainer.lock:
+                        _swap_weights(explainer.engine.model, pool.current_weights)
+                        explainer.engine.reset_baselines()
+                self._send_json(result)
+            except Exception as e:
+                self._send_json({'error': 'Reload failed', 'details': str(e)}, status=500)
+
+        def log_message(self, format, *args):
+            # Keep the request path quiet; errors are reported in responses
+            pass
+
+    return InferenceHandler
+
+def main():
+    """Main serving function"""
+    parser = argparse.ArgumentParser(description='Multi-replica RoBERTaNET CPU server')
+    parser.add_argument('--checkpoint', default='robertanet_best_model.pth')
+    parser.add_argument('--vocab', default='robertanet_vocab.json',
+                        help='Vocabulary JSON (or an older training results file containing data_info.vocab)')
+    parser.add_argument('--weights', choices=['shm', 'mmap'], default='shm',
+                        help='Share weights via shared memory or a read-only memory-mapped checkpoint')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (default: one per 4 cores)')
+    parser.add_argument('--intra-op-threads', type=int, default=None,
+                        help='Intra-op threads per worker (default: size of its core set)')
+    parser.add_argument('--inter-op-threads', type=int, default=1)
+    parser.add_argument('--max-batch-requests', type=int, default=8)
+    parser.add_argument('--window-size', type=int, default=128)
+    parser.add_argument('--stride', type=int, default=64)
+    parser.add_argument('--pooling', choices=['max', 'mean', 'attention'], default='max')
+    parser.add_argument('--glove-length', type=int, default=None,
+                        help='GloVe pad length (default: the training max_length stored in the checkpoint)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--request-timeout', type=float, default=30.0)
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile inference stages in every worker and export them at GET /metrics')
+    parser.add_argument('--no-explain', action='store_true',
+                        help='Do not compute token attributions for high-risk items')
+    parser.add_argument('--explain-threshold', type=float, default=0.7)
+    parser.add_argument('--explain-steps', type=int, default=16)
+    parser.add_argument('--explain-threads', type=int, default=1,
+                        help='Intra-op threads for attributions in the parent process; '
+                             'as many cores are kept free of workers for them')
+    parser.add_argument('--explain-queue-size', type=int, default=64,
+                        help='High-risk items waiting for attribution; further items are dropped')
+    parser.add_argument('--explanations-log', default='explanations.jsonl')
+    args = parser.parse_args()
+
+    print("RoBERTaNET Multi-Replica Server")
+    print("=" * 50)
+
+    # Load weights once in the parent
+    print(f"\n1. Loading checkpoint ({args.weights})...")
+    model, checkpoint = load_model_from_checkpoint(args.checkpoint, mmap=(args.weights == 'mmap'), weights_only=True)
+    del checkpoint  # Drop optimizer state and history
+    if args.weights == 'shm':
+        model.share_memory()
+    for param in model.parameters():
+        param.requires_grad_(False)
+
+    vocab = load_vocab(args.vocab)
+    scorer = create_long_text_scorer(
+        model, vocab,
+        roberta_model=model.roberta_model_name,
+        window_size=args.window_size,
+        stride=args.stride,
+        pooling=args.pooling,
+        glove_length=args.glove_length
+    )
+
+    # Fork pinned workers
+    cpu_count = len(available_cores())
+    # Attributions run in the parent; keep their cores free of workers so they do not slow inference
+    reserved_cores = 0 if args.no_explain else min(args.explain_threads, cpu_count - 1)
+    num_workers = args.workers or max(1, (cpu_count - reserved_cores) // 4)
+    print(f"\n2. Starting {num_workers} workers on {cpu_count - reserved_cores} cores...")
+    pool = WorkerPool(
+        scorer,
+        num_workers=num_workers,
+        intra_op_threads=args.intra_op_threads,
+        inter_op_threads=args.inter_op_threads,
+        max_batch_requests=args.max_batch_requests,
+        reserved_cores=reserved_cores,
+        profile=args.profile
+    )
+    pool.start()
+
+    explainer = None
+    if not args.no_explain:
+        # Runs in the parent on the same weights; workers are already forked with their own thread settings
+        if pool.parent_cores and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, pool.parent_cores)
+        torch.set_num_threads(args.explain_threads)
+        engine = TokenAttributionEngine(model, scorer.tokenizer, vocab,
+                                        steps=args.explain_steps)
+        explainer = ExplanationService(engine, risk_threshold=args.explain_threshold,
+                                       log_path=args.explanations_log,
+                                       max_queue=args.explain_queue_size)
+        print(f"Explaining items with P(bullying) >= {args.explain_threshold} into {args.explanations_log} "
+              f"on cores {pool.parent_cores or 'shared with the workers'}")
+
+    print(f"\n3. Serving on http://{args.host}:{args.port}/analyze")
+    handler = make_handler(pool, args.request_timeout, args.checkpoint, args.weights, explainer)
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        server.server_close()
+        pool.stop()
+
+if __name__ == "__main__":
+    main()
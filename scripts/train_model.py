@@ -11,11 +11,20 @@ from sklearn.metrics import accuracy_score, precision_recall_fscore_support, con
 import json
 import os
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 # Import our custom modules
 from model_architecture import RoBERTaNET, create_model
-from data_preprocessing import create_sample_dataset, prepare_data
+from data_preprocessing import create_sample_dataset, prepare_data, prepare_streaming_data
+from profiler import NULL_PROFILER, StageProfiler
+from run_store import RunLogger, RunStore
+
+def _num_batches(loader: DataLoader) -> Optional[int]:
+    """Number of batches, or None for streaming loaders of unknown length"""
+    try:
+        return len(loader)
+    except TypeError:
+        return None
 
 class ModelTrainer:
     """Training manager for RoBERTaNET model"""
@@ -24,18 +33,44 @@ class ModelTrainer:
                  model: RoBERTaNET,
                  device: str = 'cpu',
                  learning_rate: float = 2e-5,
-                 weight_decay: float = 0.01):
+                 weight_decay: float = 0.01,
+                 glove_lr_multiplier: float = 10.0,
+                 classifier_lr_multiplier: float = 5.0,
+                 profiler: Optional[StageProfiler] = None,
+                 run_logger: Optional[RunLogger] = None):
         
         self.model = model.to(device)
         self.device = device
         self.learning_rate = learning_rate
         
-        # Optimizer with different learning rates for different components
-        self.optimizer = optim.AdamW([
-            {'params': self.model.roberta.parameters(), 'lr': learning_rate},
-            {'params': self.model.glove_embedding.parameters(), 'lr': learning_rate * 10},
-            {'params': self.model.classifier.parameters(), 'lr': learning_rate * 5}
-        ], weight_decay=weight_decay)
+        # Optional per-step/per-epoch metrics sink (see run_store.py)
+        self.run_logger = run_logger
+        self.global_step = 0
+        self.epoch = 0
+        
+        # Stage profiler shared with the model so forward stages are recorded too
+        self.profiler = profiler if profiler is not None else NULL_PROFILER
+        self.model.profiler = self.profiler
+        
+        # Fusion layers and layer norm train at the classifier rate
+        grouped = {id(p) for module in (self.model.roberta, self.model.glove_embedding, self.model.classifier)
+                   for p in module.parameters()}
+        fusion_params = [p for p in self.model.parameters() if id(p) not in grouped]
+        
+        # Optimizer with different learning rates for different components;
+        # frozen parameters (e.g. a compressed GloVe table) are left out
+        param_groups = [
+            {'params': list(self.model.roberta.parameters()), 'lr': learning_rate},
+            {'params': list(self.model.glove_embedding.parameters()), 'lr': learning_rate * glove_lr_multiplier},
+            {'params': list(self.model.classifier.parameters()), 'lr': learning_rate * classifier_lr_multiplier},
+            {'params': fusion_params, 'lr': learning_rate * classifier_lr_multiplier}
+        ]
+        for group in param_groups:
+            group['params'] = [p for p in group['params'] if p.requires_grad]
+        self.optimizer = optim.AdamW(
+            [group for group in param_groups if group['params']],
+            weight_decay=weight_decay
+        )
         
         # Loss function
         self.criterion = nn.CrossEntropyLoss()
@@ -48,19 +83,43 @@ class ModelTrainer:
             'val_acc': []
         }
         
+    def save_checkpoint(self, path: str, **extra):
+        """Save model, optimizer and history so training can be resumed"""
+        checkpoint = {
+            'model_state_dict': self.model.state_dict(),
+            'optimizer_state_dict': self.optimizer.state_dict(),
+            'train_history': self.train_history,
+            'model_config': self.model.get_model_info()
+        }
+        checkpoint.update(extra)
+        torch.save(checkpoint, path)
+        
+    def load_checkpoint(self, path: str) -> Dict:
+        """Restore model, optimizer and history from a checkpoint"""
+        checkpoint = torch.load(path, map_location=self.device)
+        self.model.load_state_dict(checkpoint['model_state_dict'])
+        if 'optimizer_state_dict' in checkpoint:
+            self.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+        if 'train_history' in checkpoint:
+            self.train_history = checkpoint['train_history']
+        return checkpoint
+        
     def train_epoch(self, train_loader: DataLoader) -> Tuple[float, float]:
         """Train for one epoch"""
         self.model.train()
         total_loss = 0
         all_predictions = []
         all_labels = []
+        num_batches = 0
+        total_batches = _num_batches(train_loader) or '?'
         
-        for batch_idx, batch in enumerate(train_loader):
+        for batch_idx, batch in enumerate(self.profiler.iter_loader(train_loader)):
             # Move batch to device
-            input_ids = batch['input_ids'].to(self.device)
-            attention_mask = batch['attention_mask'].to(self.device)
-            glove_input_ids = batch['glove_input_ids'].to(self.device)
-            labels = batch['labels'].to(self.device)
+            with self.profiler.stage('host_to_device'):
+                input_ids = batch['input_ids'].to(self.device)
+                attention_mask = batch['attention_mask'].to(self.device)
+                glove_input_ids = batch['glove_input_ids'].to(self.device)
+                labels = batch['labels'].to(self.device)
             
             # Forward pass
             self.optimizer.zero_grad()
@@ -68,30 +127,52 @@ class ModelTrainer:
             loss = self.criterion(logits, labels)
             
             # Backward pass
-            loss.backward()
-            torch.nn.utils.clip_grad_norm_(self.model.parameters(), max_norm=1.0)
-            self.optimizer.step()
+            with self.profiler.stage('backward'):
+                loss.backward()
+            with self.profiler.stage('optimizer_step'):
+                torch.nn.utils.clip_grad_norm_(self.model.parameters(), max_norm=1.0)
+                self.optimizer.step()
+            self.profiler.step(num_samples=labels.size(0))
             
             # Track metrics
-            total_loss += loss.item()
+            batch_loss = loss.item()
+            total_loss += batch_loss
+            num_batches += 1
+            self.global_step += 1
             predictions = torch.argmax(logits, dim=1)
             all_predictions.extend(predictions.cpu().numpy())
             all_labels.extend(labels.cpu().numpy())
             
+            if self.run_logger is not None:
+                self.run_logger.log_step(self.global_step, self.epoch, loss=batch_loss,
+                                         lr=self.optimizer.param_groups[0]['lr'])
+            
             if batch_idx % 10 == 0:
-                print(f"  Batch {batch_idx}/{len(train_loader)}, Loss: {loss.item():.4f}")
+                print(f"  Batch {batch_idx}/{total_batches}, Loss: {batch_loss:.4f}")
         
-        avg_loss = total_loss / len(train_loader)
-        accuracy = accuracy_score(all_labels, all_predictions)
+        avg_loss = total_loss / max(num_batches, 1)
+        # Plain floats keep checkpoints loadable with torch.load(weights_only=True)
+        accuracy = float(accuracy_score(all_labels, all_predictions))
         
         return avg_loss, accuracy
     
     def validate(self, val_loader: DataLoader) -> Tuple[float, float, Dict]:
         """Validate the model"""
+        # Keep validation out of the training profile: the model's stages are not
+        # recorded and the time spent is excluded from samples_per_second
+        self.model.profiler = NULL_PROFILER
+        try:
+            with self.profiler.paused():
+                return self._validate(val_loader)
+        finally:
+            self.model.profiler = self.profiler
+    
+    def _validate(self, val_loader: DataLoader) -> Tuple[float, float, Dict]:
         self.model.eval()
         total_loss = 0
         all_predictions = []
         all_labels = []
+        num_batches = 0
         
         with torch.no_grad():
             for batch in val_loader:
@@ -107,12 +188,14 @@ class ModelTrainer:
                 
                 # Track metrics
                 total_loss += loss.item()
+                num_batches += 1
                 predictions = torch.argmax(logits, dim=1)
                 all_predictions.extend(predictions.cpu().numpy())
                 all_labels.extend(labels.cpu().numpy())
         
-        avg_loss = total_loss / len(val_loader)
-        accuracy = accuracy_score(all_labels, all_predictions)
+        avg_loss = total_loss / max(num_batches, 1)
+        # Plain floats keep checkpoints loadable with torch.load(weights_only=True)
+        accuracy = float(accuracy_score(all_labels, all_predictions))
         
         # Detailed metrics
         precision, recall, f1, _ = precision_recall_fscore_support(
@@ -146,6 +229,11 @@ class ModelTrainer:
         for epoch in range(num_epochs):
             print(f"\nEpoch {epoch + 1}/{num_epochs}")
             print("-" * 50)
+            self.epoch = epoch
+            
+            # Reseed streaming shuffle buffers
+            if hasattr(train_loader.dataset, 'set_epoch'):
+                train_loader.dataset.set_epoch(epoch)
             
             # Training
             train_loss, train_acc = self.train_epoch(train_loader)
@@ -159,23 +247,31 @@ class ModelTrainer:
             self.train_history['val_loss'].append(val_loss)
             self.train_history['val_acc'].append(val_acc)
             
+            if self.run_logger is not None:
+                self.run_logger.log_epoch(
+                    epoch,
+                    train_loss=train_loss,
+                    train_acc=train_acc,
+                    val_loss=val_loss,
+                    val_acc=val_acc,
+                    val_precision=val_metrics['precision'],
+                    val_recall=val_metrics['recall'],
+                    val_f1=val_metrics['f1'],
+                    confusion_matrix=val_metrics['confusion_matrix']
+                )
+            
             # Print epoch results
             print(f"Train Loss: {train_loss:.4f}, Train Acc: {train_acc:.4f}")
             print(f"Val Loss: {val_loss:.4f}, Val Acc: {val_acc:.4f}")
             print(f"Val F1: {val_metrics['f1']:.4f}")
+            if self.profiler.enabled:
+                self.profiler.print_summary()
             
             # Save best model
             if val_acc > best_val_acc:
                 best_val_acc = val_acc
                 best_metrics = val_metrics
-                torch.save({
-                    'model_state_dict': self.model.state_dict(),
-                    'optimizer_state_dict': self.optimizer.state_dict(),
-                    'epoch': epoch,
-                    'val_acc': val_acc,
-                    'train_history': self.train_history,
-                    'model_config': self.model.get_model_info()
-                }, save_path)
+                self.save_checkpoint(save_path, epoch=epoch, val_acc=val_acc)
                 print(f"New best model saved! Val Acc: {val_acc:.4f}")
         
         print(f"\nTraining completed!")
@@ -196,13 +292,23 @@ def main():
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
     print(f"Using device: {device}")
     
-    # Create sample dataset
-    print("\n1. Creating sample dataset...")
-    df = create_sample_dataset()
+    max_length = 512
+    data_paths = os.environ.get('ROBERTANET_DATA')
+    if data_paths:
+        # Stream sharded files (comma-separated globs) instead of the sample dataset
+        print("\n1-2. Preparing streaming data loaders...")
+        train_loader, val_loader, test_loader, data_info = prepare_streaming_data(data_paths.split(','), max_length=max_length)
+    else:
+        # Create sample dataset
+        print("\n1. Creating sample dataset...")
+        df = create_sample_dataset()
+        
+        # Prepare data
+        print("\n2. Preparing data loaders...")
+        train_loader, val_loader, test_loader, data_info = prepare_data(df, max_length=max_length)
     
-    # Prepare data
-    print("\n2. Preparing data loaders...")
-    train_loader, val_loader, test_loader, data_info = prepare_data(df)
+    # The vocabulary is stored as its own artifact rather than inside the results
+    vocab = data_info.pop('vocab')
     
     # Create model
     print("\n3. Creating RoBERTaNET model...")
@@ -212,23 +318,37 @@ def main():
         'roberta_model': 'roberta-base',
         'num_classes': data_info['num_classes'],
         'dropout_rate': 0.3,
-        'fusion_method': 'concatenate'
+        'fusion_method': 'concatenate',
+        'max_length': max_length
     }
     
     model = create_model(model_config)
     
+    # Start a tracked run; ROBERTANET_RUNS_DIR overrides the store location
+    run_store = RunStore(os.environ.get('ROBERTANET_RUNS_DIR', 'runs'))
+    run = run_store.create_run(model_config, data_info)
+    run.save_artifact('vocab.json', vocab)
+    with open('robertanet_vocab.json', 'w') as f:
+        json.dump(vocab, f)
+    print(f"Run {run.run_id} logging to {run.run_dir}")
+    
     # Initialize trainer
     print("\n4. Initializing trainer...")
-    trainer = ModelTrainer(model, device=device, learning_rate=2e-5)
+    profiler = StageProfiler() if os.environ.get('ROBERTANET_PROFILE') else None
+    trainer = ModelTrainer(model, device=device, learning_rate=2e-5, profiler=profiler, run_logger=run)
     
     # Train model
     print("\n5. Starting training...")
-    results = trainer.train(
-        train_loader=train_loader,
-        val_loader=val_loader,
-        num_epochs=5,  # Reduced for prototype
-        save_path='robertanet_best_model.pth'
-    )
+    try:
+        results = trainer.train(
+            train_loader=train_loader,
+            val_loader=val_loader,
+            num_epochs=5,  # Reduced for prototype
+            save_path='robertanet_best_model.pth'
+        )
+    except BaseException:
+        run.finish({}, status='failed')
+        raise
     
     # Test final model
     print("\n6. Testing final model...")
@@ -240,8 +360,17 @@ def main():
     print(f"Test Precision: {test_metrics['precision']:.4f}")
     print(f"Test Recall: {test_metrics['recall']:.4f}")
     
-    # Save final results
+    # Close the run; the history itself is already in the run's metrics.jsonl
+    run.finish({
+        'best_val_acc': results['best_val_acc'],
+        'best_metrics': results['best_metrics'],
+        'test_loss': test_loss,
+        'test_metrics': test_metrics
+    })
+    
+    # Small summary kept for tools that read training_results.json
     final_results = {
+        'run_id': run.run_id,
         'training_results': results,
         'test_metrics': test_metrics,
         'model_config': model_config,
@@ -251,8 +380,13 @@ def main():
     with open('training_results.json', 'w') as f:
         json.dump(final_results, f, indent=2)
     
+    if profiler is not None:
+        profiler.append_jsonl('profile_metrics.jsonl', run='train')
+        profiler.write_prometheus('profile_metrics.prom')
+        print("Profile metrics saved to 'profile_metrics.jsonl' and 'profile_metrics.prom'")
+    
     print("\nTraining pipeline completed successfully!")
-    print("Results saved to 'training_results.json'")
+    print(f"Results saved to '{run.run_dir}' and 'training_results.json', vocabulary to 'robertanet_vocab.json'")
 
 if __name__ == "__main__":
     main()